@@ -1,13 +1,11 @@
 from datetime import date
-from matplotlib.pyplot import figure  # type: ignore
-from matplotlib.gridspec import GridSpec  # type: ignore
-from matplotlib.transforms import Bbox  # type: ignore
-from numpy import vstack  # type: ignore
-from typing import Any, Tuple
+from io import BytesIO
+from numpy import arange  # type: ignore
+from os import getenv
+from typing import Any, Dict, NamedTuple, Optional, Tuple
 from urllib.parse import quote as quote_url
 
-from symbols import Symbol, SYMBOLS
-from get_data import read_file
+from symbols import Symbol
 
 # Analyze window sizes, short is for the actual analysis and
 # long is for trend
@@ -22,9 +20,54 @@ STOCHASTIC_LOWER_LIMIT = 0.2
 
 ALL_TIME_HIGH_RANGE = 0.97
 
+
+class Parameters(NamedTuple):
+    """
+    Analyze parameters, defaults are the constants above
+    """
+
+    window_size_short: int = WINDOW_SIZE_SHORT
+    window_size_long: int = WINDOW_SIZE_LONG
+    stochastic_window_size_k: int = STOCHASTIC_WINDOW_SIZE_K
+    stochastic_window_size_k_smooth: int = STOCHASTIC_WINDOW_SIZE_K_SMOOTH
+    stochastic_window_size_d: int = STOCHASTIC_WINDOW_SIZE_D
+    stochastic_upper_limit: float = STOCHASTIC_UPPER_LIMIT
+    stochastic_lower_limit: float = STOCHASTIC_LOWER_LIMIT
+    all_time_high_range: float = ALL_TIME_HIGH_RANGE
+
+
 # Directory for saving analyze graphs
 GRAPH_DIR = "./graphs"
 
+
+class ChartProfile(NamedTuple):
+    """
+    Output settings of drawn graphs, defaults are the original full graphs
+    """
+
+    # resolution of the saved image, the figure is 10 × 10 inches
+    dpi: int = 100
+    # image format, "png" or "webp"
+    format: str = "png"
+    # number of colors in a palette PNG, None for full colors
+    colors: Optional[int] = None
+    # WebP quality from 0 to 100
+    quality: int = 80
+    # maximum number of bars in 6-month graphs, consecutive days are
+    # combined into one bar when there are more, None for all days
+    max_points: Optional[int] = None
+    # single 6-month price graph with bollinger bands, see CompactChart
+    compact: bool = False
+
+
+# Graph output profiles, CHART_PROFILE in .env or in the environment
+# selects one. Lighter profiles are faster to draw and smaller to post.
+CHART_PROFILES = {
+    "full": ChartProfile(),
+    "light": ChartProfile(dpi=60, colors=64, max_points=65),
+    "compact": ChartProfile(dpi=60, format="webp", max_points=65, compact=True),
+}
+
 # Tradingview URL
 TRADINGVIEW_URL = "https://www.tradingview.com/chart/"
 
@@ -33,6 +76,77 @@ NORDNET_CERTIFICATES_URL = "https://www.nordnet.fi/markkinakatsaus/sertifikaatit
 NORDNET_MINIFUTURES_URL = "https://www.nordnet.fi/markkinakatsaus/minifutuurit"
 
 
+def rule_bollinger_short(last, prev):
+    """
+    Close above bb_upper and trend (ema_long_delta) negative
+    """
+    return (last["close"] > last["bb_upper"]) & (last["ema_long_delta"] < 0)
+
+
+def rule_bollinger_long(last, prev):
+    """
+    Close under bb_lower and trend (ema_long_delta) positive
+    """
+    return (last["close"] < last["bb_lower"]) & (last["ema_long_delta"] > 0)
+
+
+def rule_all_time_high(last, prev):
+    """
+    Two last closes over ath_lower and ath_lower has not risen
+    """
+    return (
+        (last["close"] > last["ath_lower"])
+        & (prev["close"] > prev["ath_lower"])
+        & (last["ath_lower"] == prev["ath_lower"])
+    )
+
+
+# Highlighting rules as (name, Nordnet direction, rule, fields, summary
+# text). Rules take the last and previous bar as mappings from field name
+# to value, and work with scalars as well as with arrays of bars. Fields
+# are the price and indicator fields the rule uses, so that only the
+# indicators the rules need are computed, see batch.rule_fields.
+RULES = [
+    (
+        "bollinger_short",
+        "D",
+        rule_bollinger_short,
+        ["close", "bb_upper", "ema_long_delta"],
+        "lopetus bollinger bandin yläpuolella ja trendi laskeva => ylireagointi => short",
+    ),
+    (
+        "bollinger_long",
+        "U",
+        rule_bollinger_long,
+        ["close", "bb_lower", "ema_long_delta"],
+        "lopetus bollinger bandin alapuolella ja trendi nouseva => ylireagointi => long",
+    ),
+    (
+        "all_time_high",
+        "U",
+        rule_all_time_high,
+        ["close", "ath_lower"],
+        "kaksi edellistä lopetusta ATH-kaistalla, ja kaista ei ole noussut => ehkä kohta menee => long",
+    ),
+]
+
+
+# Fields drawn by Chart
+CHART_FIELDS = [
+    "high",
+    "low",
+    "close",
+    "volume",
+    "ema_long",
+    "ath",
+    "ath_lower",
+    "bb_upper",
+    "bb_lower",
+    "stoch_k",
+    "stoch_d",
+]
+
+
 def analyze(symbol) -> Tuple[Any, bool, str]:
     """
     Analyze a company's stock data
@@ -67,6 +181,9 @@ def analyze(symbol) -> Tuple[Any, bool, str]:
      - hightlight: boolean whether this symbol should be highlighted
      - summary: summary string
     """
+    # get_data imports the download libraries, not needed for stored data
+    from get_data import read_file
+
     df = read_file(symbol)
 
     df["hl2"] = (df.high + df.low) / 2
@@ -97,18 +214,30 @@ def analyze(symbol) -> Tuple[Any, bool, str]:
     df["ath"] = df["high"].cummax()
     df["ath_lower"] = df["ath"] * ALL_TIME_HIGH_RANGE
 
-    opn = df["open"].iat[-1]
-    close = df["close"].iat[-1]
-    close_prev = df["close"].iat[-2]
-    high = df["high"].iat[-1]
-    low = df["low"].iat[-1]
-    trend = df["ema_long_delta"].iat[-1]
-    bb_upper = df["bb_upper"].iat[-1]
-    bb_lower = df["bb_lower"].iat[-1]
-    stoch_k = df["stoch_k"].iat[-1]
-    stoch_d = df["stoch_d"].iat[-1]
-    ath_lower_prev = df["ath_lower"].iat[-2]
-    ath_lower = df["ath_lower"].iat[-1]
+    (highlight, summary) = summarize(symbol, df.iloc[-1], df.iloc[-2])
+
+    return (df, highlight, summary)
+
+
+def summarize(symbol: Symbol, last, prev) -> Tuple[bool, str]:
+    """
+    Evaluate highlighting rules and write a summary for the last bar
+
+    Both bars are mappings from field name to value, so this works with
+    pandas rows (`df.iloc[-1]`) as well as with plain dictionaries from
+    the batch engine in `batch.py`.
+
+    :param symbol: market symbol being summarized
+    :param last: last bar with fields added by analyze
+    :param prev: second to last bar with fields added by analyze
+    :return (highlight, summary): a tuple with
+     - hightlight: boolean whether this symbol should be highlighted
+     - summary: summary string
+    """
+    opn = last["open"]
+    close = last["close"]
+    high = last["high"]
+    low = last["low"]
 
     summary = "{0}\n".format(symbol.name)
     summary += "```\n"
@@ -121,24 +250,11 @@ def analyze(symbol) -> Tuple[Any, bool, str]:
     highlight = False
     nordnet_dir = None
 
-    if close > bb_upper and trend < 0:
-        nordnet_dir = "D"
-        highlight = True
-        summary += "- lopetus bollinger bandin yläpuolella ja trendi laskeva => ylireagointi => short\n"
-
-    if close < bb_lower and trend > 0:
-        nordnet_dir = "U"
-        highlight = True
-        summary += "- lopetus bollinger bandin alapuolella ja trendi nouseva => ylireagointi => long\n"
-
-    if (
-        close > ath_lower
-        and close_prev > ath_lower_prev
-        and ath_lower == ath_lower_prev
-    ):
-        nordnet_dir = "U"
-        highlight = True
-        summary += "- kaksi edellistä lopetusta ATH-kaistalla, ja kaista ei ole noussut => ehkä kohta menee => long\n"
+    for (_, direction, rule, _, text) in RULES:
+        if rule(last, prev):
+            nordnet_dir = direction
+            highlight = True
+            summary += "- {0}\n".format(text)
 
     summary += "\n<{0}?symbol={1}>".format(TRADINGVIEW_URL, symbol.symbol_tradingview)
     nordnet_certificates_url = "{0}?direction={1}&underlyingName={2}".format(
@@ -151,12 +267,71 @@ def analyze(symbol) -> Tuple[Any, bool, str]:
         nordnet_certificates_url, nordnet_minifutures_url
     )
 
-    return (df, highlight, summary)
+    return (highlight, summary)
 
 
-def draw(symbol: Symbol, df) -> str:
+def chart_profile(name: Optional[str] = None) -> ChartProfile:
     """
-    Draw graphs for given symbol and analyzing result
+    Graph output profile by name
+
+    :param name: name in CHART_PROFILES, default is CHART_PROFILE from the
+     environment or "full"
+    :returns: profile
+    """
+    if name is None:
+        name = getenv("CHART_PROFILE") or "full"
+    if name not in CHART_PROFILES:
+        raise ValueError(
+            "unknown chart profile {0}, use one of {1}".format(
+                name, ", ".join(CHART_PROFILES)
+            )
+        )
+    return CHART_PROFILES[name]
+
+
+def downsample(df, max_points: Optional[int]):
+    """
+    Combine consecutive bars so that there are at most max_points bars
+
+    Bars are combined from the end, so the last bar is always a whole
+    group ending on the latest day. Combined bars have the first open,
+    highest high, lowest low, total volume and the last value of other
+    fields, dated on their last day.
+
+    :param df: pandas dataframe with a date index
+    :param max_points: maximum number of bars, None to keep all
+    :returns: dataframe with combined bars
+    """
+    if max_points is None or len(df) <= max_points:
+        return df
+    step = -(-len(df) // max_points)
+    count = -(-len(df) // step)
+    groups = count - 1 - (len(df) - 1 - arange(len(df))) // step
+    # last day of each group
+    ends = len(df) - 1 - step * arange(count)[::-1]
+
+    aggregations = {column: "last" for column in df.columns}
+    for (column, aggregation) in [
+        ("open", "first"),
+        ("high", "max"),
+        ("low", "min"),
+        ("volume", "sum"),
+    ]:
+        if column in aggregations:
+            aggregations[column] = aggregation
+    grouped = df.groupby(groups).agg(aggregations)
+    grouped.index = df.index[ends]
+    return grouped
+
+
+class Chart:
+    """
+    Reusable figure for drawing analyze graphs
+
+    The figure, grid, axes, lines and legends are built once. Drawing a
+    symbol only updates line data, replaces the filled areas and volume
+    bars, and sets limits and title before saving. Layout is computed
+    with tight_layout for the first symbol drawn and reused after that.
 
     6-month graph with
     - close price line
@@ -170,174 +345,349 @@ def draw(symbol: Symbol, df) -> str:
     - close price line
     - high-low price area
     - bollinger bands area
-
-    Graphs are stored in GRAPH_DIR
-
-    :param symbol: market symbol for graphing
-    :param df: pandas dataframe with analyze results
     """
-    now = date.today()
-    filename = "{0}/{1}-{2}.png".format(GRAPH_DIR, now, symbol.symbol_marketstack)
-
-    df_6mo = df.last("6M")
-    df_14d = df.last("14D")
-
-    fig = figure(figsize=(10, 10))
-    fig.suptitle("{0} ({1})".format(symbol.name, symbol.symbol_tradingview))
-
-    # gs divides the graph to two graphs vertically
-    gs = GridSpec(2, 1, figure=fig)
 
-    # top_gs divides the top graph to four vertically
-    # here the hspace=0 hides top graph's x ticks, so this implies that they have to
-    # share the x axis
-    top_gs = gs[0].subgridspec(4, 1, hspace=0)
-
-    # use 3/4 of the top graph for 6 month price
-    ax_6mo_price = fig.add_subplot(top_gs[:-1, :], autoscaley_on=False)
-    ax_6mo_price.set_ylabel("Price")
+    def __init__(self):
+        # matplotlib is imported only when something is drawn
+        from matplotlib.gridspec import GridSpec  # type: ignore
+        from matplotlib.pyplot import figure  # type: ignore
+
+        self.fig = figure(figsize=(10, 10))
+        self.title = self.fig.suptitle("")
+
+        # gs divides the graph to two graphs vertically
+        gs = GridSpec(2, 1, figure=self.fig)
+
+        # top_gs divides the top graph to four vertically
+        # here the hspace=0 hides top graph's x ticks, so this implies that they have
+        # to share the x axis
+        top_gs = gs[0].subgridspec(4, 1, hspace=0)
+
+        # use 3/4 of the top graph for 6 month price
+        self.ax_6mo_price = self.fig.add_subplot(top_gs[:-1, :], autoscaley_on=False)
+        self.ax_6mo_price.set_ylabel("Price")
+
+        # use 1/4 of the top graph for 6 month volume
+        self.ax_6mo_volume = self.fig.add_subplot(
+            top_gs[-1, :], sharex=self.ax_6mo_price
+        )
+        self.ax_6mo_volume.set_ylabel("Volume")
+
+        # bottom_gs is the whole bottom graph (this is not actually required, we
+        # could use the gs[1] directly, but add it for completeness and for future
+        # use)
+        bottom_gs = gs[1].subgridspec(3, 1, hspace=0)
+
+        # use 2/3 of bottom graph for 14 day price and bollinger bands
+        self.ax_14d_price = self.fig.add_subplot(bottom_gs[:-1, :], autoscaley_on=False)
+        self.ax_14d_price.set_ylabel("Price")
+
+        # 1/3 for stochastic
+        self.ax_stochastic = self.fig.add_subplot(
+            bottom_gs[-1, :],
+            sharex=self.ax_14d_price,
+            yscale="logit",
+            ylim=(10e-3, 1 - 10e-3),
+        )
+
+        # lines as (line, "6mo" or "14d", column), data is set when drawing
+        self.lines = [
+            (self._line(self.ax_6mo_price, 2, "black", "close"), "6mo", "close"),
+            (
+                self._line(
+                    self.ax_6mo_price,
+                    2,
+                    "blue",
+                    "EMA-{0}".format(WINDOW_SIZE_LONG),
+                ),
+                "6mo",
+                "ema_long",
+            ),
+            (self._line(self.ax_6mo_price, 1, "red", "all-time high"), "6mo", "ath"),
+            (self._line(self.ax_6mo_price, 1, "red", fmt="--"), "6mo", "ath_lower"),
+            (self._line(self.ax_14d_price, 2, "black", "close"), "14d", "close"),
+            (self._line(self.ax_14d_price, 1, "red", "all-time high"), "14d", "ath"),
+            (self._line(self.ax_14d_price, 1, "red", fmt="--"), "14d", "ath_lower"),
+            (
+                self._line(self.ax_stochastic, 1, "blue", "stochastic %K"),
+                "14d",
+                "stoch_k",
+            ),
+            (
+                self._line(self.ax_stochastic, 1, "red", "stochastic %D"),
+                "14d",
+                "stoch_d",
+            ),
+        ]
+
+        # filled areas and bars are replaced when drawing, empty ones are
+        # added here for the legends
+        self.artists = self._fill_areas(None, None)
+
+        # legend entries in the order the artists were originally plotted
+        lines = [line for (line, _, _) in self.lines]
+        self.ax_6mo_price.legend(
+            handles=[lines[0], self.artists[0], lines[1], lines[2]], loc=2
+        )
+        self.ax_14d_price.legend(
+            handles=[lines[4], self.artists[1], self.artists[2], lines[5]], loc=2
+        )
+        self.ax_stochastic.legend(handles=[lines[7], lines[8]], loc=2)
+
+        self.axes = [
+            self.ax_6mo_price,
+            self.ax_6mo_volume,
+            self.ax_14d_price,
+            self.ax_stochastic,
+        ]
+        self.laid_out = False
+
+    def _line(self, ax, linewidth: int, color: str, label=None, fmt="-"):
+        (line,) = ax.plot_date(
+            x=[], y=[], fmt=fmt, linewidth=linewidth, color=color, label=label
+        )
+        return line
+
+    def _fill_areas(self, df_6mo, df_14d):
+        """
+        Add filled areas and volume bars, empty if dataframes are None
+        """
+        empty = {"index": [], "high": [], "low": [], "bb_upper": [], "bb_lower": []}
+        data_6mo = empty if df_6mo is None else df_6mo
+        data_14d = empty if df_14d is None else df_14d
+        index_6mo = empty["index"] if df_6mo is None else df_6mo.index
+        index_14d = empty["index"] if df_14d is None else df_14d.index
+
+        artists = [
+            self.ax_6mo_price.fill_between(
+                x=index_6mo,
+                y1=data_6mo["high"],
+                y2=data_6mo["low"],
+                alpha=0.2,
+                linewidth=1,
+                color="black",
+                label="high-low",
+            ),
+            self.ax_14d_price.fill_between(
+                x=index_14d,
+                y1=data_14d["high"],
+                y2=data_14d["low"],
+                alpha=0.2,
+                linewidth=1,
+                color="black",
+                label="high-low",
+            ),
+            self.ax_14d_price.fill_between(
+                x=index_14d,
+                y1=data_14d["bb_upper"],
+                y2=data_14d["bb_lower"],
+                alpha=0.2,
+                linewidth=1,
+                color="green",
+                label="bollinger bands (EMA-{0})".format(WINDOW_SIZE_SHORT),
+            ),
+            self.ax_stochastic.fill_between(
+                x=index_14d,
+                y1=STOCHASTIC_UPPER_LIMIT,
+                y2=STOCHASTIC_LOWER_LIMIT,
+                alpha=0.2,
+                linewidth=1,
+                color="magenta",
+            ),
+        ]
+        if df_6mo is not None:
+            artists.append(
+                self.ax_6mo_volume.bar(df_6mo.index, df_6mo["volume"], color="black")
+            )
+        return artists
+
+    def _set_limits(self, df_6mo, df_14d):
+        """
+        Set price limits, all-time high can be outside the viewed area
+        """
+        self.ax_6mo_price.set_ylim(
+            top=max([df_6mo["high"].max(), df_6mo["ema_long"].max()]) * 1.01,
+            bottom=min([df_6mo["low"].min(), df_6mo["ema_long"].min()]) * 0.99,
+        )
+        self.ax_14d_price.set_ylim(
+            top=max([df_14d["high"].max(), df_14d["bb_upper"].max()]) * 1.01,
+            bottom=min([df_14d["low"].min(), df_14d["bb_lower"].min()]) * 0.99,
+        )
+
+    def _save(self, filename: str, profile: ChartProfile):
+        """
+        Save the figure in the format of the profile
+        """
+        if profile.format == "webp":
+            self.fig.savefig(
+                filename,
+                format="webp",
+                dpi=profile.dpi,
+                pil_kwargs={"quality": profile.quality},
+            )
+        elif profile.colors is None:
+            self.fig.savefig(filename, format="png", dpi=profile.dpi)
+        else:
+            # Pillow is installed with matplotlib
+            from PIL import Image  # type: ignore
+
+            # uncompressed, since it is compressed again after quantizing
+            buffer = BytesIO()
+            self.fig.savefig(
+                buffer, format="png", dpi=profile.dpi, pil_kwargs={"compress_level": 0}
+            )
+            buffer.seek(0)
+            with Image.open(buffer) as image:
+                image.convert("RGB").quantize(profile.colors).save(
+                    filename, format="png", optimize=True
+                )
+
+    def draw(
+        self, symbol: Symbol, df, filename: str, profile: ChartProfile = ChartProfile()
+    ):
+        """
+        Draw graphs for given symbol and analyzing result to a file
 
-    # use 1/4 of the top graph for 6 month volume
-    ax_6mo_volume = fig.add_subplot(top_gs[-1, :], sharex=ax_6mo_price)
-    ax_6mo_volume.set_ylabel("Volume")
+        :param symbol: market symbol for graphing
+        :param df: pandas dataframe with analyze results
+        :param filename: image file
+        :param profile: output profile
+        """
+        df_6mo = downsample(df.last("6M"), profile.max_points)
+        df_14d = df.last("14D")
 
-    # bottom_gs is the whole bottom graph (this is not actually required, we could
-    # use the gs[1] directly, but add it for completeness and for future use)
-    bottom_gs = gs[1].subgridspec(3, 1, hspace=0)
+        self.title.set_text("{0} ({1})".format(symbol.name, symbol.symbol_tradingview))
 
-    # use 2/3 of bottom graph for 14 day price and bollinger bands
-    ax_14d_price = fig.add_subplot(bottom_gs[:-1, :], autoscaley_on=False)
-    ax_14d_price.set_ylabel("Price")
+        for (line, period, column) in self.lines:
+            data = df_6mo if period == "6mo" else df_14d
+            line.set_data(data.index, data[column])
 
-    # 1/3 for stochastic
-    ax_stochastic = fig.add_subplot(
-        bottom_gs[-1, :], sharex=ax_14d_price, yscale="logit", ylim=(10e-3, 1 - 10e-3)
-    )
+        for artist in self.artists:
+            artist.remove()
+        self.artists = self._fill_areas(df_6mo, df_14d)
 
-    ax_6mo_price.plot_date(
-        x=df_6mo.index,
-        y=df_6mo["close"],
-        fmt="-",
-        linewidth=2,
-        color="black",
-        label="close",
-    )
-    ax_6mo_price.fill_between(
-        x=df_6mo.index,
-        y1=df_6mo["high"],
-        y2=df_6mo["low"],
-        alpha=0.2,
-        linewidth=1,
-        color="black",
-        label="high-low",
-    )
-    ax_6mo_price.plot_date(
-        x=df_6mo.index,
-        y=df_6mo["ema_long"],
-        fmt="-",
-        linewidth=2,
-        color="blue",
-        label="EMA-{0}".format(WINDOW_SIZE_LONG),
-    )
+        for ax in self.axes:
+            ax.relim()
+            ax.autoscale_view()
+        self._set_limits(df_6mo, df_14d)
 
-    ax_6mo_price.plot_date(
-        x=df_6mo.index,
-        y=df_6mo["ath"],
-        fmt="-",
-        linewidth=1,
-        color="red",
-        label="all-time high",
-    )
-
-    ax_6mo_price.plot_date(
-        x=df_6mo.index, y=df_6mo["ath_lower"], fmt="--", linewidth=1, color="red"
-    )
-
-    # all-time high can be outside the viewed area
-    ax_6mo_price.set_ylim(
-        top=max([df_6mo["high"].max(), df_6mo["ema_long"].max()]) * 1.01,
-        bottom=min([df_6mo["low"].min(), df_6mo["ema_long"].min()]) * 0.99,
-    )
+        if not self.laid_out:
+            self.fig.tight_layout()
+            self.laid_out = True
+        self._save(filename, profile)
 
-    ax_6mo_volume.bar(df_6mo.index, df_6mo["volume"], color="black")
 
-    ax_14d_price.plot_date(
-        x=df_14d.index,
-        y=df_14d["close"],
-        fmt="-",
-        linewidth=2,
-        color="black",
-        label="close",
-    )
-    ax_14d_price.fill_between(
-        x=df_14d.index,
-        y1=df_14d["high"],
-        y2=df_14d["low"],
-        alpha=0.2,
-        linewidth=1,
-        color="black",
-        label="high-low",
-    )
-    ax_14d_price.fill_between(
-        x=df_14d.index,
-        y1=df_14d["bb_upper"],
-        y2=df_14d["bb_lower"],
-        alpha=0.2,
-        linewidth=1,
-        color="green",
-        label="bollinger bands (EMA-{0})".format(WINDOW_SIZE_SHORT),
-    )
-    ax_14d_price.plot_date(
-        x=df_14d.index,
-        y=df_14d["ath"],
-        fmt="-",
-        linewidth=1,
-        color="red",
-        label="all-time high",
-    )
+class CompactChart(Chart):
+    """
+    Reusable single-panel figure for small graphs, 10 × 5 inches
 
-    ax_14d_price.plot_date(
-        x=df_14d.index, y=df_14d["ath_lower"], fmt="--", linewidth=1, color="red"
-    )
+    6-month graph with
+    - close price line
+    - high-low price area
+    - hl2 exponential moving average for WINDOW_SIZE_LONG
+    - all-time high
+    - bollinger bands area
+    """
 
-    # all-time high can be outside the viewed area
-    ax_14d_price.set_ylim(
-        top=max([df_14d["high"].max(), df_14d["bb_upper"].max()]) * 1.01,
-        bottom=min([df_14d["low"].min(), df_14d["bb_lower"].min()]) * 0.99,
-    )
+    def __init__(self):
+        from matplotlib.pyplot import figure  # type: ignore
+
+        self.fig = figure(figsize=(10, 5))
+        self.title = self.fig.suptitle("")
+
+        self.ax_6mo_price = self.fig.add_subplot(autoscaley_on=False)
+        self.ax_6mo_price.set_ylabel("Price")
+
+        self.lines = [
+            (self._line(self.ax_6mo_price, 2, "black", "close"), "6mo", "close"),
+            (
+                self._line(
+                    self.ax_6mo_price,
+                    2,
+                    "blue",
+                    "EMA-{0}".format(WINDOW_SIZE_LONG),
+                ),
+                "6mo",
+                "ema_long",
+            ),
+            (self._line(self.ax_6mo_price, 1, "red", "all-time high"), "6mo", "ath"),
+            (self._line(self.ax_6mo_price, 1, "red", fmt="--"), "6mo", "ath_lower"),
+        ]
+
+        self.artists = self._fill_areas(None, None)
+
+        lines = [line for (line, _, _) in self.lines]
+        self.ax_6mo_price.legend(
+            handles=[lines[0], self.artists[0], self.artists[1], lines[1], lines[2]],
+            loc=2,
+        )
+
+        self.axes = [self.ax_6mo_price]
+        self.laid_out = False
+
+    def _fill_areas(self, df_6mo, df_14d):
+        """
+        Add filled areas, empty if df_6mo is None
+        """
+        empty = {"index": [], "high": [], "low": [], "bb_upper": [], "bb_lower": []}
+        data = empty if df_6mo is None else df_6mo
+        index = empty["index"] if df_6mo is None else df_6mo.index
+
+        return [
+            self.ax_6mo_price.fill_between(
+                x=index,
+                y1=data["high"],
+                y2=data["low"],
+                alpha=0.2,
+                linewidth=1,
+                color="black",
+                label="high-low",
+            ),
+            self.ax_6mo_price.fill_between(
+                x=index,
+                y1=data["bb_upper"],
+                y2=data["bb_lower"],
+                alpha=0.2,
+                linewidth=1,
+                color="green",
+                label="bollinger bands (EMA-{0})".format(WINDOW_SIZE_SHORT),
+            ),
+        ]
+
+    def _set_limits(self, df_6mo, df_14d):
+        columns_top = ["high", "ema_long", "bb_upper"]
+        columns_bottom = ["low", "ema_long", "bb_lower"]
+        self.ax_6mo_price.set_ylim(
+            top=max(df_6mo[column].max() for column in columns_top) * 1.01,
+            bottom=min(df_6mo[column].min() for column in columns_bottom) * 0.99,
+        )
+
+
+# Charts reused by draw, full and compact, built on first use
+_charts: Dict[bool, Chart] = {}
+
+
+def draw(symbol: Symbol, df, profile: Optional[ChartProfile] = None) -> str:
+    """
+    Draw graphs for given symbol and analyzing result
 
-    ax_stochastic.plot_date(
-        x=df_14d.index,
-        y=df_14d["stoch_k"],
-        fmt="-",
-        linewidth=1,
-        color="blue",
-        label="stochastic %K",
-    )
+    Graphs are described in Chart and CompactChart, and stored in GRAPH_DIR
 
-    ax_stochastic.plot_date(
-        x=df_14d.index,
-        y=df_14d["stoch_d"],
-        fmt="-",
-        linewidth=1,
-        color="red",
-        label="stochastic %D",
-    )
+    :param symbol: market symbol for graphing
+    :param df: pandas dataframe with analyze results
+    :param profile: output profile, default is chart_profile()
+    :returns: image filename
+    """
+    if profile is None:
+        profile = chart_profile()
 
-    ax_stochastic.fill_between(
-        x=df_14d.index,
-        y1=STOCHASTIC_UPPER_LIMIT,
-        y2=STOCHASTIC_LOWER_LIMIT,
-        alpha=0.2,
-        linewidth=1,
-        color="magenta",
+    now = date.today()
+    filename = "{0}/{1}-{2}.{3}".format(
+        GRAPH_DIR, now, symbol.symbol_marketstack, profile.format
     )
 
-    ax_6mo_price.legend(loc=2)
-    ax_14d_price.legend(loc=2)
-    ax_stochastic.legend(loc=2)
-
-    fig.tight_layout()
-    fig.savefig(filename)
+    if profile.compact not in _charts:
+        _charts[profile.compact] = CompactChart() if profile.compact else Chart()
+    _charts[profile.compact].draw(symbol, df, filename, profile)
 
     return filename
@@ -0,0 +1,142 @@
+from argparse import ArgumentParser, ArgumentTypeError
+from numpy import full, nan, nonzero  # type: ignore
+from pandas import DataFrame  # type: ignore
+from typing import Any, Dict, List, Optional, Tuple
+
+from analyze import RULES
+from batch import Universe, compute, load, rule_fields
+from symbols import catalog
+
+# Forward return horizons in bars
+HORIZONS = [1, 5, 10, 20]
+
+
+def forward_returns(close, horizon: int):
+    """
+    Return from each bar's close to the close horizon bars later
+
+    :param close: bars × symbols close prices
+    :param horizon: number of bars
+    :returns: bars × symbols returns, NaN where the later bar is missing
+    """
+    returns = full(close.shape, nan)
+    returns[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    return returns
+
+
+def signals(universe: Universe, indicators: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Evaluate highlighting rules on every bar of every symbol
+
+    The same rules as analyze.summarize uses on the last bar are applied
+    to whole arrays, with each bar against the bar before it.
+
+    :param universe: universe with prices
+    :param indicators: indicators computed for the universe
+    :returns: dictionary from rule name to bars × symbols boolean array,
+     False on the first bar
+    """
+    columns = dict(universe.prices)
+    columns.update(indicators)
+    last = {name: values[1:] for (name, values) in columns.items()}
+    prev = {name: values[:-1] for (name, values) in columns.items()}
+
+    result = {}
+    for (name, _, rule, _, _) in RULES:
+        fired = full(universe.prices["close"].shape, False)
+        fired[1:] = rule(last, prev)
+        result[name] = fired
+    return result
+
+
+def backtest(
+    universe: Universe, indicators: Dict[str, Any], horizons: List[int] = HORIZONS
+) -> Tuple[Any, Any]:
+    """
+    Backtest highlighting rules over the whole history
+
+    Returns are signed by the rule's Nordnet direction, so a positive
+    return means the signal was right. A hit is a positive signed return.
+
+    :param universe: universe with prices
+    :param indicators: indicators computed for the universe
+    :param horizons: forward return horizons in bars
+    :returns (table, stats): a tuple with
+     - table: pandas dataframe with a row for each signal: date, symbol,
+       rule, direction and return_N for each horizon N
+     - stats: pandas dataframe indexed by rule with signal count and
+       hit_rate_N and mean_return_N for each horizon N
+    """
+    close = universe.prices["close"]
+    returns = {horizon: forward_returns(close, horizon) for horizon in horizons}
+    fired = signals(universe, indicators)
+
+    rows: Dict[str, List] = {"date": [], "symbol": [], "rule": [], "direction": []}
+    rows.update({"return_{0}".format(horizon): [] for horizon in horizons})
+    for (name, direction, _, _, _) in RULES:
+        (bars, columns) = nonzero(fired[name])
+        sign = -1 if direction == "D" else 1
+        rows["date"].extend(universe.dates[bars, columns])
+        rows["symbol"].extend(
+            universe.symbols[column].symbol_marketstack for column in columns
+        )
+        rows["rule"].extend([name] * len(bars))
+        rows["direction"].extend([direction] * len(bars))
+        for horizon in horizons:
+            rows["return_{0}".format(horizon)].extend(
+                sign * returns[horizon][bars, columns]
+            )
+    table = DataFrame(rows)
+
+    stats = DataFrame(
+        {"signals": table.groupby("rule").size()},
+        index=[name for (name, _, _, _, _) in RULES],
+    ).fillna(0)
+    for horizon in horizons:
+        column = table.groupby("rule")["return_{0}".format(horizon)]
+        stats["hit_rate_{0}".format(horizon)] = column.apply(
+            lambda values: (values.dropna() > 0).mean()
+        )
+        stats["mean_return_{0}".format(horizon)] = column.mean()
+    return (table, stats)
+
+
+def parse_horizon(value: str) -> int:
+    """
+    Forward return horizon argument, a positive number of bars
+    """
+    try:
+        bars = int(value)
+    except ValueError:
+        raise ArgumentTypeError(
+            "horizon must be a number of bars, not {0}".format(value)
+        )
+    if bars < 1:
+        raise ArgumentTypeError("horizon must be at least 1 bar, not {0}".format(bars))
+    return bars
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = ArgumentParser(description="Backtest highlighting rules")
+    parser.add_argument(
+        "--horizons",
+        type=parse_horizon,
+        nargs="+",
+        default=HORIZONS,
+        help="forward return horizons in bars",
+    )
+    parser.add_argument("--output", help="CSV file for the signal table")
+    args = parser.parse_args(argv)
+
+    universe = load(catalog().symbols)
+    indicators = compute(universe, fields=rule_fields())
+    (table, stats) = backtest(universe, indicators, args.horizons)
+
+    print(stats.to_string(float_format="{0:.4f}".format))
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print("Signals saved to {0}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
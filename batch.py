@@ -0,0 +1,417 @@
+from numpy import (  # type: ignore
+    add,
+    empty,
+    errstate,
+    fmax,
+    full,
+    isnan,
+    multiply,
+    nan,
+    sqrt,
+    subtract,
+    where,
+)
+from numpy.lib.stride_tricks import sliding_window_view  # type: ignore
+from os import path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from analyze import RULES, Parameters, summarize
+from store import FIELDS, read, store_filename
+from symbols import Symbol, catalog
+
+# Type of prices and indicators in a universe, "f4" halves the memory but
+# rules comparing close values to bands can then differ near the limits
+PRICE_DTYPE = "f8"
+
+
+class Universe(NamedTuple):
+    """
+    Price history for a set of symbols as aligned 2-D arrays
+
+    Arrays are bars × symbols. Each column holds one symbol's own bars,
+    aligned so that the last row is the latest bar of every symbol.
+    Symbols with a shorter history are padded with NaN (NaT for dates)
+    at the top, so rolling windows never span over padding and the
+    results equal the ones from analyze.analyze.
+    """
+
+    symbols: List[Symbol]
+    dates: Any
+    prices: Dict[str, Any]
+
+
+def load(
+    symbols: Optional[List[Symbol]] = None, dtype: str = PRICE_DTYPE
+) -> Universe:
+    """
+    Read stored bars of all given symbols
+
+    Symbols without stored bars, for example ones that have never been
+    downloaded successfully, are left out of the universe.
+
+    :param symbols: market symbols being read, default is all symbols
+    :param dtype: type of prices, "f4" takes half the memory of "f8"
+    :returns: universe with prices of the symbols
+    """
+    if symbols is None:
+        symbols = catalog().symbols
+    missing = [symbol for symbol in symbols if not path.isfile(store_filename(symbol))]
+    for symbol in missing:
+        print("{0} => no stored data, skipped".format(symbol.name))
+    if missing:
+        symbols = [symbol for symbol in symbols if symbol not in missing]
+    bars = [read(symbol) for symbol in symbols]
+
+    length = max([len(data) for data in bars], default=0)
+    dates = full((length, len(symbols)), "NaT", dtype="datetime64[D]")
+    prices = {field: full((length, len(symbols)), nan, dtype=dtype) for field in FIELDS}
+
+    for (index, data) in enumerate(bars):
+        start = length - len(data)
+        dates[start:, index] = data["date"]
+        for field in FIELDS:
+            prices[field][start:, index] = data[field]
+
+    return Universe(symbols, dates, prices)
+
+
+def select(universe: Universe, columns: List[int]) -> Universe:
+    """
+    Select a subset of symbols from a universe
+
+    :param universe: universe with prices
+    :param columns: indices of the selected symbols
+    :returns: universe with only the selected symbols
+    """
+    return Universe(
+        [universe.symbols[column] for column in columns],
+        universe.dates[:, columns],
+        {field: values[:, columns] for (field, values) in universe.prices.items()},
+    )
+
+
+def _rolling(values, window: int, func, out):
+    """
+    Apply func over a rolling window along the bars axis into out
+
+    Rows without a full window are NaN, like with pandas rolling.
+    """
+    out[: window - 1] = nan
+    if len(values) >= window:
+        windows = sliding_window_view(values, window, axis=0)
+        func(windows, axis=-1, out=out[window - 1 :])
+    return out
+
+
+def _rolling_mean(values, window: int, out):
+    return _rolling(values, window, lambda x, axis, out: x.mean(axis, out=out), out)
+
+
+def _rolling_std(values, window: int, mean, out):
+    """
+    Rolling sample standard deviation into out, with the rolling mean of
+    the same window given, like numpy std computes it
+    """
+    out[: window - 1] = nan
+    if len(values) >= window:
+        windows = sliding_window_view(values, window, axis=0)
+        deviations = windows - mean[window - 1 :, ..., None]
+        deviations *= deviations
+        deviations.sum(axis=-1, out=out[window - 1 :])
+        out[window - 1 :] /= window - 1
+        sqrt(out, out=out)
+    return out
+
+
+def _rolling_max(values, window: int, out):
+    return _rolling(values, window, lambda x, axis, out: x.max(axis, out=out), out)
+
+
+def _rolling_min(values, window: int, out):
+    return _rolling(values, window, lambda x, axis, out: x.min(axis, out=out), out)
+
+
+def _ewm(values, span: int, out):
+    """
+    Exponential moving average along the bars axis into out
+
+    Same as pandas `ewm(span=span, adjust=False).mean()`: starts from the
+    first non-NaN value of each column and keeps the previous value over
+    NaN rows.
+    """
+    if len(values) == 0:
+        return out
+    alpha = 2 / (span + 1)
+    out[0] = values[0]
+    for row in range(1, len(values)):
+        prev = out[row - 1]
+        current = values[row]
+        out[row] = where(
+            isnan(prev),
+            current,
+            where(isnan(current), prev, (1 - alpha) * prev + alpha * current),
+        )
+    return out
+
+
+def _cummax(values, out):
+    """
+    Cumulative maximum along the bars axis into out, NaN rows stay NaN
+    """
+    fmax.accumulate(values, axis=0, out=out)
+    out[isnan(values)] = nan
+    return out
+
+
+def _hl2(ind: Dict[str, Any], p: Parameters, out):
+    add(ind["high"], ind["low"], out=out)
+    out /= 2
+    return out
+
+
+def _ema_long_delta(ind: Dict[str, Any], p: Parameters, out):
+    out[:1] = nan
+    subtract(ind["ema_long"][1:], ind["ema_long"][:-1], out=out[1:])
+    return out
+
+
+def _bb_upper(ind: Dict[str, Any], p: Parameters, out):
+    multiply(ind["stdev_short"], 2, out=out)
+    out += ind["sma_short"]
+    return out
+
+
+def _bb_lower(ind: Dict[str, Any], p: Parameters, out):
+    multiply(ind["stdev_short"], -2, out=out)
+    out += ind["sma_short"]
+    return out
+
+
+def _stoch_k_raw(ind: Dict[str, Any], p: Parameters, out):
+    subtract(ind["close"], ind["stoch_k_lowest"], out=out)
+    with errstate(divide="ignore", invalid="ignore"):
+        out /= ind["stoch_k_highest"] - ind["stoch_k_lowest"]
+    return out
+
+
+# Indicators as name: (fields it is computed from, parameters it uses,
+# function). Functions take the prices and indicators computed so far,
+# parameters and an array to write the result to. Fields are the same as
+# analyze.analyze adds to a dataframe.
+INDICATORS: Dict[str, Tuple[List[str], List[str], Callable]] = {
+    "hl2": (["high", "low"], [], _hl2),
+    "sma_short": (
+        ["hl2"],
+        ["window_size_short"],
+        lambda ind, p, out: _rolling_mean(ind["hl2"], p.window_size_short, out),
+    ),
+    "sma_long": (
+        ["hl2"],
+        ["window_size_long"],
+        lambda ind, p, out: _rolling_mean(ind["hl2"], p.window_size_long, out),
+    ),
+    "ema_short": (
+        ["hl2"],
+        ["window_size_short"],
+        lambda ind, p, out: _ewm(ind["hl2"], p.window_size_short, out),
+    ),
+    "ema_long": (
+        ["hl2"],
+        ["window_size_long"],
+        lambda ind, p, out: _ewm(ind["hl2"], p.window_size_long, out),
+    ),
+    "ema_long_delta": (["ema_long"], [], _ema_long_delta),
+    # shares the rolling mean with sma_short
+    "stdev_short": (
+        ["hl2", "sma_short"],
+        ["window_size_short"],
+        lambda ind, p, out: _rolling_std(
+            ind["hl2"], p.window_size_short, ind["sma_short"], out
+        ),
+    ),
+    # bollinger bands
+    "bb_upper": (["sma_short", "stdev_short"], [], _bb_upper),
+    "bb_lower": (["sma_short", "stdev_short"], [], _bb_lower),
+    # stochastic
+    "stoch_k_highest": (
+        ["high"],
+        ["stochastic_window_size_k"],
+        lambda ind, p, out: _rolling_max(
+            ind["high"], p.stochastic_window_size_k, out
+        ),
+    ),
+    "stoch_k_lowest": (
+        ["low"],
+        ["stochastic_window_size_k"],
+        lambda ind, p, out: _rolling_min(ind["low"], p.stochastic_window_size_k, out),
+    ),
+    "stoch_k_raw": (
+        ["close", "stoch_k_highest", "stoch_k_lowest"],
+        [],
+        _stoch_k_raw,
+    ),
+    "stoch_k": (
+        ["stoch_k_raw"],
+        ["stochastic_window_size_k_smooth"],
+        lambda ind, p, out: _rolling_mean(
+            ind["stoch_k_raw"], p.stochastic_window_size_k_smooth, out
+        ),
+    ),
+    "stoch_d": (
+        ["stoch_k"],
+        ["stochastic_window_size_d"],
+        lambda ind, p, out: _rolling_mean(
+            ind["stoch_k"], p.stochastic_window_size_d, out
+        ),
+    ),
+    # all-time high
+    "ath": (["high"], [], lambda ind, p, out: _cummax(ind["high"], out)),
+    "ath_lower": (
+        ["ath"],
+        ["all_time_high_range"],
+        lambda ind, p, out: multiply(ind["ath"], p.all_time_high_range, out=out),
+    ),
+}
+
+
+def resolve(fields: Iterable[str]) -> List[str]:
+    """
+    Indicators needed for given fields, each after the ones it depends on
+
+    :param fields: price and indicator fields
+    :returns: list of indicator names
+    """
+    order: List[str] = []
+
+    def visit(name: str):
+        if name in FIELDS or name in order:
+            return
+        (dependencies, _, _) = INDICATORS[name]
+        for dependency in dependencies:
+            visit(dependency)
+        order.append(name)
+
+    for name in fields:
+        visit(name)
+    return order
+
+
+def rule_fields(names: Optional[List[str]] = None) -> List[str]:
+    """
+    Fields the highlighting rules use, see analyze.RULES
+
+    :param names: rule names, default is all rules
+    :returns: list of price and indicator fields
+    """
+    return [
+        field
+        for (name, _, _, fields, _) in RULES
+        if names is None or name in names
+        for field in fields
+    ]
+
+
+def rule_parameters(names: Optional[List[str]] = None) -> List[str]:
+    """
+    Parameters the highlighting rules depend on through their fields
+
+    :param names: rule names, default is all rules
+    :returns: list of Parameters field names, in Parameters order
+    """
+    used = {
+        parameter
+        for name in resolve(rule_fields(names))
+        for parameter in INDICATORS[name][1]
+    }
+    return [parameter for parameter in Parameters._fields if parameter in used]
+
+
+def compute(
+    universe: Universe,
+    parameters: Parameters = Parameters(),
+    out: Optional[Dict[str, Any]] = None,
+    fields: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Compute analyze indicators for the whole universe at once
+
+    Each indicator is a bars × symbols array of the same type as prices.
+    Only the indicators needed for given fields are computed, each once,
+    see INDICATORS.
+
+    Repeated computations, like in a parameter sweep, can pass the
+    indicators of the previous call as out. Its arrays are overwritten
+    with the results instead of allocating new ones.
+
+    :param universe: universe with prices
+    :param parameters: window sizes and ranges, default is analyze constants
+    :param out: indicators to reuse, arrays of another shape or type are
+     replaced
+    :param fields: fields needed, for example rule_fields() or
+     analyze.CHART_FIELDS, default is all indicators
+    :returns: dictionary of indicator arrays, out if given
+    """
+    close = universe.prices["close"]
+    names = resolve(INDICATORS if fields is None else fields)
+
+    ind: Dict[str, Any] = {} if out is None else out
+    for name in [name for name in ind if name not in names]:
+        del ind[name]
+
+    values = dict(universe.prices)
+    for name in names:
+        array = ind.get(name)
+        if array is None or array.shape != close.shape or array.dtype != close.dtype:
+            array = empty(close.shape, dtype=close.dtype)
+        (_, _, function) = INDICATORS[name]
+        values[name] = ind[name] = function(values, parameters, array)
+
+    return ind
+
+
+def _bar(universe: Universe, indicators: Dict[str, Any], row: int, column: int):
+    """
+    Collect prices and indicators of one bar to a dictionary
+    """
+    bar = {field: universe.prices[field][row, column] for field in FIELDS}
+    bar.update({name: values[row, column] for (name, values) in indicators.items()})
+    return bar
+
+
+def evaluate(
+    universe: Universe, indicators: Dict[str, Any]
+) -> List[Tuple[Symbol, bool, str]]:
+    """
+    Evaluate highlighting rules for every symbol in the universe
+
+    :param universe: universe with prices
+    :param indicators: indicators computed for the universe
+    :returns: list of (symbol, highlight, summary) tuples in universe order
+    """
+    results = []
+    for (column, symbol) in enumerate(universe.symbols):
+        last = _bar(universe, indicators, -1, column)
+        prev = _bar(universe, indicators, -2, column)
+        (highlight, summary) = summarize(symbol, last, prev)
+        results.append((symbol, highlight, summary))
+    return results
+
+
+def to_dataframe(universe: Universe, indicators: Dict[str, Any], column: int):
+    """
+    Build a dataframe of one symbol in the universe for drawing
+
+    :param universe: universe with prices
+    :param indicators: indicators computed for the universe
+    :param column: index of the symbol in the universe
+    :returns: pandas dataframe indexed by date, like from analyze.analyze
+    """
+    from pandas import DataFrame, DatetimeIndex  # type: ignore
+
+    dates = universe.dates[:, column]
+    valid = ~isnan(dates)
+    data = {field: universe.prices[field][valid, column] for field in FIELDS}
+    data.update(
+        {name: values[valid, column] for (name, values) in indicators.items()}
+    )
+    return DataFrame(data, index=DatetimeIndex(dates[valid], name="date"))
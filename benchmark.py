@@ -0,0 +1,326 @@
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from json import dumps as json_dumps, loads as json_loads
+from multiprocessing import get_context
+from numpy import maximum, minimum  # type: ignore
+from numpy.random import default_rng  # type: ignore
+from os import chdir, getcwd, makedirs, path
+from resource import RUSAGE_SELF, getrusage
+from sys import platform
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Dict, List
+
+from analyze import CHART_FIELDS, CHART_PROFILES, analyze, chart_profile, draw
+from batch import compute, load, select, to_dataframe
+from config import DATA_DIR
+from get_data import read_file
+from render import RENDER_START_METHOD, render
+from screen import screen
+from store import ingest
+from symbols import Symbol
+
+# Benchmark results, one JSON object per line
+BENCHMARK_FILE = "{0}/benchmarks.jsonl".format(DATA_DIR)
+
+# Stages that can be benchmarked, in the order they are run
+STAGES = [
+    "read_file",
+    "ingest",
+    "load",
+    "screen",
+    "compute",
+    "analyze",
+    "draw",
+    "run",
+]
+
+
+def synthetic_symbols(count: int) -> List[Symbol]:
+    return [
+        Symbol(
+            "Synthetic {0:05d}".format(index),
+            "SYN{0:05d}.XSYN".format(index),
+            "SYN:SYN{0:05d}".format(index),
+        )
+        for index in range(count)
+    ]
+
+
+def generate(symbols: List[Symbol], bars: int, seed: int = 0):
+    """
+    Write synthetic end-of-day data in Marketstack format to DATA_DIR
+
+    Prices are geometric random walks with intraday ranges around open and
+    close, one bar per weekday ending today.
+
+    :param symbols: market symbols to generate
+    :param bars: number of bars for each symbol
+    :param seed: random seed
+    """
+    now = date.today()
+    days: List[str] = []
+    day = now
+    while len(days) < bars:
+        if day.weekday() < 5:
+            days.append("{0}T00:00:00+0000".format(day.isoformat()))
+        day -= timedelta(days=1)
+    days.reverse()
+
+    rng = default_rng(seed)
+    makedirs(DATA_DIR, exist_ok=True)
+    for symbol in symbols:
+        close = rng.uniform(5, 500) * (1 + rng.normal(0.0005, 0.02, bars)).cumprod()
+        opn = close * (1 + rng.normal(0, 0.01, bars))
+        high = maximum(opn, close) * (1 + abs(rng.normal(0, 0.01, bars)))
+        low = minimum(opn, close) * (1 - abs(rng.normal(0, 0.01, bars)))
+        volume = rng.integers(1000, 100000, bars)
+
+        data = [
+            {
+                "open": round(float(opn[index]), 2),
+                "high": round(float(high[index]), 2),
+                "low": round(float(low[index]), 2),
+                "close": round(float(close[index]), 2),
+                "volume": float(volume[index]),
+                "symbol": symbol.symbol_marketstack,
+                "exchange": "XSYN",
+                "date": days[index],
+            }
+            for index in range(bars - 1, -1, -1)
+        ]
+        filename = "{0}/{1}-{2}.json".format(DATA_DIR, now, symbol.symbol_marketstack)
+        with open(filename, mode="w") as file:
+            file.write(json_dumps({"data": data}))
+
+
+def peak_memory() -> float:
+    """
+    Peak resident memory of this process so far in megabytes
+
+    Each size is benchmarked in its own process, see run_size, so this is
+    the peak of the stages of one size run so far.
+    """
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak / 1024 / 1024 if platform == "darwin" else peak / 1024
+
+
+def benchmark(
+    symbols: List[Symbol], stages: List[str], draw_count: int, profile: str = "full"
+) -> List[Dict[str, Any]]:
+    """
+    Time stages of the pipeline for given symbols
+
+    Data must already be in DATA_DIR. Stages are run in STAGES order, and
+    later stages use the store written by ingest.
+
+    :param symbols: market symbols to analyze
+    :param stages: names of stages to run
+    :param draw_count: number of symbols drawn in draw stage
+    :param profile: chart profile of draw and run stages, see
+     analyze.CHART_PROFILES
+    :returns: list of results with stage, seconds, symbols per second and
+     peak memory of the stages run so far
+    """
+    results: List[Dict[str, Any]] = []
+
+    def timed(stage: str, count: int, func):
+        start = perf_counter()
+        value = func()
+        seconds = perf_counter() - start
+        results.append(
+            {
+                "stage": stage,
+                "symbols": count,
+                "seconds": seconds,
+                "symbols_per_second": count / seconds if seconds else 0.0,
+                "peak_memory_mb": peak_memory(),
+            }
+        )
+        print(
+            "{0:<10} {1:>6} symbols {2:>9.3f} s {3:>10.1f} symbols/s {4:>8.1f} MB".format(
+                stage,
+                count,
+                seconds,
+                results[-1]["symbols_per_second"],
+                results[-1]["peak_memory_mb"],
+            )
+        )
+        return value
+
+    # store and universe are needed by later stages even if not benchmarked
+    if "read_file" in stages:
+        timed("read_file", len(symbols), lambda: [read_file(s) for s in symbols])
+    if "ingest" in stages:
+        timed("ingest", len(symbols), lambda: ingest(symbols))
+    else:
+        ingest(symbols)
+    if "load" in stages:
+        universe = timed("load", len(symbols), lambda: load(symbols))
+    else:
+        universe = load(symbols)
+    if "screen" in stages:
+        timed("screen", len(symbols), lambda: screen(universe))
+    if "compute" in stages:
+        timed("compute", len(symbols), lambda: compute(universe))
+    if "analyze" in stages:
+        timed("analyze", len(symbols), lambda: [analyze(s) for s in symbols])
+
+    if "draw" in stages:
+        drawn = select(universe, list(range(min(draw_count, len(symbols)))))
+        indicators = compute(drawn)
+        dfs = [to_dataframe(drawn, indicators, i) for i in range(len(drawn.symbols))]
+        timed(
+            "draw",
+            len(drawn.symbols),
+            lambda: [
+                draw(s, df, chart_profile(profile))
+                for (s, df) in zip(drawn.symbols, dfs)
+            ],
+        )
+
+    if "run" in stages:
+
+        def run():
+            universe = load(symbols)
+            highlighted = [
+                index
+                for (index, (_, highlight, _)) in enumerate(screen(universe))
+                if highlight
+            ]
+            universe = select(universe, highlighted)
+            indicators = compute(universe, fields=CHART_FIELDS)
+            items = (
+                (symbol, to_dataframe(universe, indicators, index))
+                for (index, symbol) in enumerate(universe.symbols)
+            )
+            return list(render(items, profile=chart_profile(profile)))
+
+        timed("run", len(symbols), run)
+
+    return results
+
+
+def compare(results: List[Dict], previous: List[Dict]):
+    """
+    Print how results changed from the previous run with the same sizes
+    and chart profile
+    """
+
+    def key(result: Dict):
+        # results from before chart profiles were drawn with the full one
+        return (
+            result["stage"],
+            result["symbols"],
+            result["bars"],
+            result.get("chart_profile", "full"),
+        )
+
+    before = {key(result): result for result in previous}
+    for result in results:
+        if key(result) in before:
+            previous_result = before[key(result)]
+            print(
+                "{0:<10} {1:>6} symbols {2:>6} bars {3:>7.2f}x time vs {4}".format(
+                    result["stage"],
+                    result["symbols"],
+                    result["bars"],
+                    result["seconds"] / previous_result["seconds"],
+                    previous_result["timestamp"],
+                )
+            )
+
+
+def run_size(
+    count: int, bars: int, stages: List[str], draw_count: int, profile: str
+) -> List[Dict[str, Any]]:
+    """
+    Benchmark given stages with synthetic data in a temporary directory
+
+    :param count: number of symbols
+    :param bars: number of bars for each symbol
+    :returns: results, see benchmark
+    """
+    symbols = synthetic_symbols(count)
+    cwd = getcwd()
+    # data, store and graphs are written to relative paths
+    with TemporaryDirectory() as tmp:
+        chdir(tmp)
+        try:
+            makedirs("./graphs")
+            generate(symbols, bars)
+            return benchmark(symbols, stages, draw_count, profile)
+        finally:
+            chdir(cwd)
+
+
+def main():
+    parser = ArgumentParser(
+        description="Benchmark fetch, analyze and draw stages with synthetic data"
+    )
+    parser.add_argument(
+        "--symbols", type=int, nargs="+", default=[150], help="universe sizes"
+    )
+    parser.add_argument(
+        "--bars", type=int, nargs="+", default=[1000], help="history lengths"
+    )
+    parser.add_argument(
+        "--stages", nargs="+", default=STAGES, choices=STAGES, help="stages to run"
+    )
+    parser.add_argument(
+        "--draw", type=int, default=10, help="number of symbols in draw stage"
+    )
+    parser.add_argument(
+        "--chart-profile",
+        default="full",
+        choices=list(CHART_PROFILES),
+        help="chart profile of draw and run stages",
+    )
+    args = parser.parse_args()
+
+    results_file = path.abspath(BENCHMARK_FILE)
+    previous = []
+    if path.isfile(results_file):
+        with open(results_file, mode="r") as file:
+            previous = [json_loads(line) for line in file if line.strip()]
+
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    results = []
+    for count in args.symbols:
+        for bars in args.bars:
+            print("{0} symbols, {1} bars".format(count, bars))
+            # a new process for each size, so that peak memory is not the
+            # peak of an earlier, larger size
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=get_context(RENDER_START_METHOD)
+            ) as pool:
+                size_results = pool.submit(
+                    run_size,
+                    count,
+                    bars,
+                    args.stages,
+                    args.draw,
+                    args.chart_profile,
+                ).result()
+            for result in size_results:
+                result.update(
+                    {
+                        "timestamp": timestamp,
+                        "bars": bars,
+                        "chart_profile": args.chart_profile,
+                    }
+                )
+                results.append(result)
+
+    compare(results, previous)
+
+    with open(results_file, mode="a") as file:
+        for result in results:
+            file.write(json_dumps(result) + "\n")
+    print("Results appended to {0}".format(results_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,25 @@
+from asyncio import Queue, gather, get_running_loop, run_coroutine_threadsafe, wrap_future
+from concurrent.futures import Future, ThreadPoolExecutor
 from discord import Client, File as DiscordFile  # type: ignore
 from dotenv import load_dotenv  # type: ignore
 from os import getenv, path
+from typing import List, Optional
 
-from analyze import analyze, draw
-from get_data import get_data
-from symbols import Symbol, SYMBOLS
+from cache import evict, get, put
+from metrics import count, timer, write_summary
+from pipeline import download, highlights
+from render import RENDER_MAX_PENDING
+from symbols import Symbol, catalog
 
 # Environment variables that should be defined for these functions:
 # - DISCORD_BOT_TOKEN
 # - DISCORD_CHANNEL_ID
-load_dotenv()
+# Optional:
+# - EXCHANGE and WATCHLIST, for analyzing only a subset of symbols
+
+# Number of messages being posted at a time, discord.py waits on Discord's
+# rate limits by itself
+POST_WORKERS = 2
 
 
 class BotClient(Client):
@@ -17,15 +27,21 @@ class BotClient(Client):
     Discord bot for printing out stock analysis
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, symbols: List[Symbol], fetching: Future, *args, **kwargs):
+        """
+        :param symbols: market symbols to analyze
+        :param fetching: future of downloading data, running while logging in
+        """
         super().__init__(*args, **kwargs)
+        self.symbols = symbols
+        self.fetching = fetching
 
     async def on_ready(self):
         """
-        When the bot is ready, start analyzing stocks via main
+        When the bot is ready, start analyzing stocks via analyze_and_post
         """
         print("Logged in as {0} ({1})".format(self.user.name, self.user.id))
-        await main(self)
+        await analyze_and_post(self)
 
     async def post(self, message, filename):
         """
@@ -35,26 +51,97 @@ class BotClient(Client):
         :param filename: file to be attached with the message
         """
         channel = self.get_channel(int(getenv("DISCORD_CHANNEL_ID")))
+        if channel is None:
+            raise ValueError(
+                "channel {0} not found".format(getenv("DISCORD_CHANNEL_ID"))
+            )
         with open(filename, mode="rb") as file:
             await channel.send(content=message, file=DiscordFile(file))
 
 
-async def main(bot):
+def posted(cache_key: str) -> bool:
     """
-    Loop through symbols, analyze them and post to discord the
-    ones that have been highlighted
+    Whether a highlight has already been posted, see analyze_and_post
+
+    :param cache_key: cache key of the symbol, see cache.key
+    """
+    entry = get(cache_key)
+    return entry is not None and bool(entry.get("posted"))
+
+
+async def analyze_and_post(bot):
+    """
+    Analyze symbols and post to discord the ones that have been highlighted
+
+    Posting is idempotent, a highlight is posted only once for the same
+    data even if the bot is restarted.
+
+    Works as a pipeline: analysis runs in an executor, graphs are drawn in
+    a process pool and put to a queue as soon as each one is ready, see
+    pipeline.highlights, and POST_WORKERS tasks post them from the queue
+    while the rest are still being drawn. A failed post is reported and
+    left unposted, and the posters keep emptying the queue so that drawing
+    is not blocked.
 
     :param bot: discord bot client
     """
+    loop = get_running_loop()
+    await wrap_future(bot.fetching)
+
     print("Analyzing stock data and posting to discord")
-    for (index, symbol) in enumerate(SYMBOLS):
-        print("{0} ({1}/{2})".format(symbol.name, index + 1, len(SYMBOLS)))
-        (df, highlight, summary) = analyze(symbol)
-        if highlight:
-            filename = draw(symbol, df)
-            await bot.post(summary, filename)
+    queue: Queue = Queue(maxsize=RENDER_MAX_PENDING)
+
+    def produce():
+        for item in highlights(bot.symbols, skip=posted, market=True):
+            run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    async def producer():
+        try:
+            await loop.run_in_executor(None, produce)
+        finally:
+            for _ in range(POST_WORKERS):
+                await queue.put(None)
+
+    async def poster():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            (symbol, cache_key, summary, filename) = item
+            try:
+                with timer("post", symbol.symbol_marketstack):
+                    await bot.post(summary, filename)
+            except Exception as e:
+                # posted again on the next run
+                print("{0} => posting failed: {1!r}".format(symbol.name, e))
+                count("failed_posts")
+                continue
+            put(cache_key, posted=True)
+
+    try:
+        await gather(producer(), *[poster() for _ in range(POST_WORKERS)])
+    finally:
+        evict()
+        write_summary("bot")
+
+
+def main(symbols: Optional[List[Symbol]] = None):
+    """
+    Log in to discord while downloading data, then analyze and post
+
+    :param symbols: market symbols, default is EXCHANGE and WATCHLIST
+     from the environment, or all symbols
+    """
+    load_dotenv()
+    if symbols is None:
+        symbols = catalog().select(
+            exchange=getenv("EXCHANGE"), watchlist=getenv("WATCHLIST")
+        )
+
+    fetching = ThreadPoolExecutor(max_workers=1).submit(download, symbols)
+    client = BotClient(symbols, fetching)
+    client.run(getenv("DISCORD_BOT_TOKEN"))
 
 
-get_data()
-client = BotClient()
-client.run(getenv("DISCORD_BOT_TOKEN"))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+from hashlib import sha256
+from json import dumps as json_dumps, loads as json_loads
+from os import listdir, makedirs, path, remove, replace
+from shutil import copyfile
+from time import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from analyze import ChartProfile, Parameters
+from batch import Universe, select
+from config import DATA_DIR
+from screen import screen
+from store import store_filename
+from symbols import Symbol
+
+# Directory for cached results, a JSON entry and possibly a graph per key
+CACHE_DIR = "{0}/cache".format(DATA_DIR)
+
+# Entries older than this are evicted, and oldest entries are evicted
+# until the cache is smaller than CACHE_MAX_BYTES
+CACHE_MAX_AGE = 7 * 24 * 60 * 60
+CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+# Change when analysis or summary changes in a way parameters do not show
+CACHE_VERSION = 1
+
+
+def key(symbol: Symbol, parameters: Parameters = Parameters()) -> str:
+    """
+    Cache key of a symbol's results
+
+    The key is a hash of the symbol, its stored bars and analyze
+    parameters, so it changes whenever any input of the results changes.
+    Watchlists are not part of the results, so moving a symbol between
+    watchlists keeps its key.
+
+    :param symbol: market symbol
+    :param parameters: analyze parameters
+    :returns: hex digest
+    """
+    # name and TradingView symbol are in summaries and graphs
+    identity = (symbol.symbol_marketstack, symbol.name, symbol.symbol_tradingview)
+    digest = sha256(repr((CACHE_VERSION, identity, parameters)).encode())
+    with open(store_filename(symbol), mode="rb") as file:
+        digest.update(file.read())
+    return digest.hexdigest()
+
+
+def _entry_filename(key: str) -> str:
+    return "{0}/{1}.json".format(CACHE_DIR, key)
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Read a cache entry
+
+    :param key: cache key
+    :returns: entry or None if not cached
+    """
+    filename = _entry_filename(key)
+    if not path.isfile(filename):
+        return None
+    with open(filename, mode="r") as file:
+        return json_loads(file.read())
+
+
+def put(key: str, **fields):
+    """
+    Add fields to a cache entry, creating it if needed
+
+    :param key: cache key
+    :param fields: fields to add, for example highlight, summary, graph or
+     posted
+    """
+    makedirs(CACHE_DIR, exist_ok=True)
+    entry = get(key) or {}
+    entry.update(fields)
+    filename = _entry_filename(key)
+    with open(filename + ".tmp", mode="w") as file:
+        file.write(json_dumps(entry))
+    replace(filename + ".tmp", filename)
+
+
+def put_graph(key: str, filename: str, profile: ChartProfile) -> str:
+    """
+    Copy a drawn graph to the cache
+
+    The profile is not a part of the key, so that highlights are not
+    posted again when it changes. It is saved with the graph instead.
+
+    :param key: cache key
+    :param filename: graph file
+    :param profile: chart profile the graph was drawn with
+    :returns: filename of the cached copy
+    """
+    cached = "{0}/{1}{2}".format(CACHE_DIR, key, path.splitext(filename)[1])
+    copyfile(filename, cached)
+    previous = (get(key) or {}).get("graph")
+    put(key, graph=cached, graph_profile=list(profile))
+    # a graph of another profile can be in another format
+    if previous not in [None, cached] and path.isfile(previous):
+        remove(previous)
+    return cached
+
+
+def cached_graph(key: str, profile: ChartProfile) -> Optional[str]:
+    """
+    Cached graph of a key
+
+    :param key: cache key
+    :param profile: chart profile the graph should be drawn with
+    :returns: filename or None if no graph is cached with the profile
+    """
+    entry = get(key)
+    if entry is None or "graph" not in entry or not path.isfile(entry["graph"]):
+        return None
+    if entry.get("graph_profile") != list(profile):
+        return None
+    return entry["graph"]
+
+
+def screen_cached(
+    universe: Universe, keys: List[str]
+) -> List[Tuple[Symbol, bool, str]]:
+    """
+    Screen symbols, using cached results where available
+
+    :param universe: universe with prices
+    :param keys: cache key of each symbol in universe order
+    :returns: list of (symbol, highlight, summary) tuples in universe order
+    """
+    results: List[Optional[Tuple[Symbol, bool, str]]] = []
+    missing = []
+    for (column, symbol) in enumerate(universe.symbols):
+        entry = get(keys[column])
+        if entry is not None and "summary" in entry:
+            results.append((symbol, entry["highlight"], entry["summary"]))
+        else:
+            results.append(None)
+            missing.append(column)
+
+    if missing:
+        for (column, result) in zip(missing, screen(select(universe, missing))):
+            (_, highlight, summary) = result
+            put(keys[column], highlight=bool(highlight), summary=summary)
+            results[column] = result
+
+    return results  # type: ignore
+
+
+def evict(max_age: float = CACHE_MAX_AGE, max_bytes: int = CACHE_MAX_BYTES):
+    """
+    Remove old entries and oldest entries over the size limit
+
+    :param max_age: maximum age of files in seconds
+    :param max_bytes: maximum total size of files
+    """
+    if not path.isdir(CACHE_DIR):
+        return
+
+    files = [
+        (path.getmtime(filename), path.getsize(filename), filename)
+        for filename in [path.join(CACHE_DIR, name) for name in listdir(CACHE_DIR)]
+    ]
+    files.sort(reverse=True)
+
+    now = time()
+    total = 0
+    for (mtime, size, filename) in files:
+        total += size
+        if now - mtime > max_age or total > max_bytes:
+            remove(filename)
@@ -0,0 +1,174 @@
+from argparse import ArgumentParser
+from dotenv import load_dotenv  # type: ignore
+from os import getenv
+from sys import exit
+from typing import List
+
+from symbols import Symbol, catalog
+
+# Stages are imported in the commands, so that a command imports only what
+# it needs: analyze does not import pandas or matplotlib, and only post
+# imports discord.
+
+
+def select_symbols(parser: ArgumentParser, args) -> List[Symbol]:
+    """
+    Symbols given with --symbol, or the ones in --exchange and --watchlist
+    """
+    if args.symbol:
+        known = catalog().by_marketstack
+        unknown = [name for name in args.symbol if name not in known]
+        if unknown:
+            parser.error("unknown symbols {0}".format(", ".join(unknown)))
+        return [known[name] for name in args.symbol]
+    try:
+        return catalog().select(exchange=args.exchange, watchlist=args.watchlist)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+def fetch(symbols: List[Symbol]) -> int:
+    """
+    Download data and convert it to the store
+
+    :returns: exit status, 1 if some symbols could not be downloaded
+    """
+    from metrics import write_summary
+    from pipeline import download
+
+    failed = download(symbols)
+    write_summary("fetch")
+    return 1 if failed else 0
+
+
+def analyze(symbols: List[Symbol], stream: bool = False) -> int:
+    """
+    Print summaries of highlighted symbols from stored data
+
+    :param stream: update saved indicator states with the bars stored
+     since the last run instead of screening the whole history, see
+     stream.py
+    :returns: exit status
+    """
+    from metrics import timer, write_summary
+    from store import ingest
+
+    ingest(symbols)
+    if stream:
+        from stream import evaluate
+
+        with timer("highlight"):
+            results = evaluate(symbols)
+    else:
+        from batch import load
+        from cache import key, screen_cached
+
+        with timer("load"):
+            universe = load(symbols)
+            keys = [key(symbol) for symbol in universe.symbols]
+        with timer("highlight"):
+            results = screen_cached(universe, keys)
+
+    highlighted = [summary for (_, highlight, summary) in results if highlight]
+    for summary in highlighted:
+        print(summary)
+    print("{0}/{1} highlighted".format(len(highlighted), len(results)))
+    write_summary("analyze")
+    return 0
+
+
+def render(symbols: List[Symbol]) -> int:
+    """
+    Analyze stored data and draw graphs of highlighted symbols
+
+    :returns: exit status
+    """
+    from cache import evict
+    from metrics import write_summary
+    from pipeline import process
+
+    process(symbols, fetch=False)
+    evict()
+    write_summary("render")
+    return 0
+
+
+def post(symbols: List[Symbol]) -> int:
+    """
+    Download, analyze and post highlighted symbols to discord
+
+    :returns: exit status
+    """
+    from bot import main as bot_main
+
+    bot_main(symbols)
+    return 0
+
+
+def main(argv=None) -> int:
+    # EXCHANGE and WATCHLIST can be defined in .env too
+    load_dotenv()
+
+    parser = ArgumentParser(description="Stock analyzer for Nordnet Markets")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for (name, description) in [
+        ("fetch", "download data from Marketstack to the store"),
+        ("analyze", "print highlighted symbols from stored data"),
+        ("render", "analyze stored data and draw highlighted symbols"),
+        ("post", "download, analyze and post highlighted symbols to discord"),
+    ]:
+        command = commands.add_parser(name, help=description)
+        command.add_argument(
+            "--exchange",
+            default=getenv("EXCHANGE"),
+            help="only symbols of this exchange, default is EXCHANGE",
+        )
+        command.add_argument(
+            "--watchlist",
+            default=getenv("WATCHLIST"),
+            help="only symbols in this watchlist, default is WATCHLIST",
+        )
+        command.add_argument(
+            "--symbol",
+            action="append",
+            metavar="SYMBOL",
+            help="only this marketstack symbol, can be repeated",
+        )
+        if name == "analyze":
+            command.add_argument(
+                "--stream",
+                action="store_true",
+                help="update saved indicator states with new bars only",
+            )
+
+    # the rest of the arguments are parsed by backtest.py and service.py
+    commands.add_parser("backtest", help="backtest highlighting rules", add_help=False)
+    commands.add_parser(
+        "serve", help="serve latest indicators and signals as JSON", add_help=False
+    )
+
+    (args, arguments) = parser.parse_known_args(argv)
+
+    if args.command == "backtest":
+        from backtest import main as backtest_main
+
+        backtest_main(arguments)
+        return 0
+    if args.command == "serve":
+        from service import main as service_main
+
+        service_main(arguments)
+        return 0
+    if arguments:
+        parser.error("unrecognized arguments: {0}".format(" ".join(arguments)))
+
+    symbols = select_symbols(parser, args)
+    if args.command == "analyze":
+        return analyze(symbols, args.stream)
+    handlers = {"fetch": fetch, "render": render, "post": post}
+    return handlers[args.command](symbols)
+
+
+if __name__ == "__main__":
+    exit(main())
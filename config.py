@@ -0,0 +1,14 @@
+# Settings shared by the stages. Nothing is imported here, so that stages
+# working on stored data do not import the download libraries of
+# get_data.py.
+
+# Directory for saving Marketstack raw data
+DATA_DIR = "./data"
+
+# Number of bars kept for each symbol, and how many days back they are
+# requested from (1000 trading days with some slack for holidays)
+HISTORY_LIMIT = 1000
+HISTORY_DAYS = 1500
+
+# Price fields used in analysis
+FIELDS = ["open", "high", "low", "close", "volume"]
@@ -1,72 +1,523 @@
-from datetime import date
-from pandas import json_normalize as pd_json_normalize, to_datetime as pd_to_datetime  # type: ignore
-from json import loads as json_loads
-from requests import get
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from json import dumps as json_dumps, loads as json_loads
+from random import uniform
+from requests import RequestException, Response, Session
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv  # type: ignore
-from os import getenv, path
+from fcntl import LOCK_EX, flock
+from os import fdopen, getenv, listdir, makedirs, path, remove, replace
+from tempfile import mkstemp
+from threading import Lock
+from time import monotonic, sleep
+from typing import Any, Dict, List, Optional, Tuple
 
-from symbols import Symbol, SYMBOLS
-
-# Marketstack API endpoint
-MARKETSTACK_URL = "http://api.marketstack.com/v1/eod"
-
-# Directory for saving Marketstack raw data
-DATA_DIR = "./data"
+from config import DATA_DIR, FIELDS, HISTORY_DAYS, HISTORY_LIMIT
+from metrics import count, timer
+from symbols import Symbol, catalog
 
 # Environment variables that should be defined for these functions:
 # - MARKETSTACK_API_KEY
+# Optional:
+# - MARKETSTACK_URL, for example a local stand-in for testing
 load_dotenv()
 
+# Marketstack API endpoint
+MARKETSTACK_URL = getenv("MARKETSTACK_URL", "http://api.marketstack.com/v1/eod")
+
+# Maximum number of rows Marketstack returns in one page
+PAGE_LIMIT = 1000
+
+# Number of symbols in one request and number of concurrent requests
+BATCH_SIZE = 10
+MAX_WORKERS = 8
+
+# Seconds to wait for a response
+REQUEST_TIMEOUT = 30
+
+# Number of attempts of a request, and backoff in seconds before the next
+# attempt, doubled after each failed attempt up to BACKOFF_MAX
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Longest wait in seconds told by Marketstack rate limit headers that is
+# waited, a batch told to wait longer fails and is downloaded on the next run
+RATE_LIMIT_MAX_WAIT = 15 * 60
+
+# Symbols that could not be downloaded in the last run, with the errors
+FAILED_FILE = "{0}/failed.json".format(DATA_DIR)
+
+
+class FetchError(Exception):
+    """
+    Marketstack returned an error or an invalid response
+    """
+
+    def __init__(self, message: str, retry: bool = False):
+        """
+        :param message: error message
+        :param retry: whether the request may succeed when retried
+        """
+        super().__init__(message)
+        self.retry = retry
+
+
+# Requests of all threads wait until this time (monotonic clock) after
+# Marketstack has told to slow down
+_paused_until = 0.0
+_pause_lock = Lock()
+
+
+def previous_files() -> Dict[str, str]:
+    """
+    Find the latest data file of each symbol saved on an earlier day
+
+    DATA_DIR is listed once for all symbols.
+
+    :returns: dictionary from marketstack symbol to filename, symbols
+     without earlier files are left out
+    """
+    now = date.today().isoformat()
+    days: Dict[str, str] = {}
+    for filename in listdir(DATA_DIR):
+        # files are named by day and symbol, 2021-02-01-ABB.XSTO.json
+        (day, symbol_marketstack) = (filename[:10], filename[11:-5])
+        if (
+            filename[10:11] != "-"
+            or not filename.endswith(".json")
+            or day >= now
+            or not symbol_marketstack
+        ):
+            continue
+        if day > days.get(symbol_marketstack, ""):
+            days[symbol_marketstack] = day
+    return {
+        symbol_marketstack: "{0}/{1}-{2}.json".format(DATA_DIR, day, symbol_marketstack)
+        for (symbol_marketstack, day) in days.items()
+    }
+
+
+def read_bars(filename: str) -> List[dict]:
+    """
+    Read bars from a marketstack data file
+
+    :param filename: data file
+    :returns: list of bars, latest first
+    """
+    with open(filename, mode="r") as file:
+        return json_loads(file.read())["data"]
+
+
+def merge_bars(new: List[dict], old: List[dict]) -> List[dict]:
+    """
+    Merge newly downloaded bars into stored history
+
+    Bars are matched by date, new bars replace old ones on the same date.
+    At most HISTORY_LIMIT latest bars are kept.
+
+    :param new: new bars
+    :param old: stored bars
+    :returns: list of bars, latest first
+    """
+    bars = {bar["date"][:10]: bar for bar in old}
+    bars.update({bar["date"][:10]: bar for bar in new})
+    return [bars[day] for day in sorted(bars, reverse=True)][:HISTORY_LIMIT]
+
+
+def _pause(seconds: float):
+    """
+    Make requests of all threads wait for given seconds
+    """
+    global _paused_until
+    with _pause_lock:
+        _paused_until = max(_paused_until, monotonic() + seconds)
+
+
+def _wait_pause():
+    """
+    Wait until requests are not paused
+    """
+    while True:
+        with _pause_lock:
+            remaining = _paused_until - monotonic()
+        if remaining <= 0:
+            return
+        sleep(remaining)
+
+
+def _retry_after(response: Response) -> Optional[float]:
+    """
+    Seconds to wait told by rate limit headers of a response
+
+    Retry-After is either seconds or an HTTP date. X-RateLimit-Reset is a
+    Unix timestamp, used when X-RateLimit-Remaining has run out.
+    """
+    value = response.headers.get("Retry-After")
+    if value is not None:
+        if value.strip().isdigit():
+            return float(value)
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return (retry_at - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        reset = response.headers.get("X-RateLimit-Reset")
+        if reset is not None and reset.strip().isdigit():
+            return float(reset) - datetime.now(timezone.utc).timestamp()
+
+    return None
+
+
+def validate(response: Response) -> Dict[str, Any]:
+    """
+    Check that a response is a complete page of Marketstack data
+
+    Invalid bars, like ones without a close, are dropped from the data
+    and the first error of each symbol is added as "invalid", a dictionary
+    from marketstack symbol to error.
 
-def get_data():
+    :param response: response of a Marketstack request
+    :returns: parsed content
+    :raises FetchError: if the response is an error or it is invalid,
+     with retry set for errors that are likely temporary
+    """
+    if response.status_code == 429 or response.status_code >= 500:
+        raise FetchError("HTTP {0}".format(response.status_code), retry=True)
+
+    try:
+        with timer("json_parse"):
+            content = response.json()
+    except ValueError:
+        # a truncated or otherwise garbled body
+        raise FetchError(
+            "invalid JSON ({0} bytes)".format(len(response.content)), retry=True
+        )
+
+    # marketstack errors are {"error": {"code": ..., "message": ...}}
+    if isinstance(content, dict) and isinstance(content.get("error"), dict):
+        error = content["error"]
+        raise FetchError(
+            "{0}: {1}".format(error.get("code"), error.get("message")),
+            retry=error.get("code") == "rate_limit_reached",
+        )
+    if not response.ok:
+        raise FetchError("HTTP {0}".format(response.status_code))
+
+    if (
+        not isinstance(content, dict)
+        or not isinstance(content.get("data"), list)
+        or not isinstance(content.get("pagination"), dict)
+        or not all(
+            isinstance(content["pagination"].get(field), int)
+            for field in ["count", "total"]
+        )
+        or content["pagination"]["count"] != len(content["data"])
+    ):
+        raise FetchError("unexpected response content", retry=True)
+
+    # a bar without a symbol cannot be told apart from the others, but an
+    # invalid bar of a symbol fails only that symbol, see fetch_batch
+    data = []
+    invalid: Dict[str, str] = {}
+    for bar in content["data"]:
+        if not isinstance(bar, dict) or not isinstance(bar.get("symbol"), str):
+            raise FetchError("invalid bar {0}".format(bar))
+        if not isinstance(bar.get("date"), str) or not isinstance(
+            bar.get("close"), (int, float)
+        ):
+            invalid.setdefault(bar["symbol"], "invalid bar {0}".format(bar))
+            continue
+        data.append(bar)
+    content["data"] = data
+    content["invalid"] = invalid
+
+    return content
+
+
+def request(session: Session, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Request a page of Marketstack data, retrying temporary failures
+
+    Failed attempts are retried with exponential backoff and jitter. When
+    Marketstack tells how long to wait with rate limit headers, requests
+    of all threads wait that long, also after the last successful request
+    before the limit resets. Waits longer than RATE_LIMIT_MAX_WAIT are not
+    waited, the request fails instead.
+
+    :param session: requests session used for the connections
+    :param params: query parameters
+    :returns: parsed and validated content
+    :raises FetchError: if the request fails MAX_ATTEMPTS times or with an
+     error that is not temporary, or if told to wait too long
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        _wait_pause()
+        response = None
+        try:
+            with timer("download"):
+                response = session.get(
+                    MARKETSTACK_URL, params=params, timeout=REQUEST_TIMEOUT
+                )
+            count("api_calls")
+            count("bytes_downloaded", len(response.content))
+            content = validate(response)
+            wait = _retry_after(response)
+            if wait is not None and wait <= RATE_LIMIT_MAX_WAIT:
+                _pause(wait)
+            return content
+        except RequestException as e:
+            error = FetchError(str(e), retry=True)
+        except FetchError as e:
+            error = e
+
+        if not error.retry or attempt == MAX_ATTEMPTS - 1:
+            raise error
+
+        count("retries")
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * uniform(0.5, 1.0)
+        wait = _retry_after(response) if response is not None else None
+        if wait is not None:
+            if wait > RATE_LIMIT_MAX_WAIT:
+                raise FetchError("{0}, told to wait {1:.0f} s".format(error, wait))
+            delay = max(wait, delay)
+            _pause(delay)
+        print("{0}, retrying in {1:.1f} s".format(error, delay))
+        sleep(delay)
+
+    raise FetchError("no attempts")
+
+
+def fetch_batch(
+    session: Session, symbols: List[str], date_from: date
+) -> Tuple[Dict[str, List[dict]], Dict[str, str]]:
+    """
+    Download end-of-day data for several symbols with one paginated request
+
+    :param session: requests session used for the connections
+    :param symbols: marketstack symbols to download
+    :param date_from: first date to download
+    :returns: (bars, invalid) tuple with
+     - bars: dictionary from marketstack symbol to its bars, latest first
+     - invalid: dictionary from marketstack symbol to error of the symbols
+       that had invalid bars, these are left out of bars
+    :raises FetchError: if a page cannot be downloaded, see request
+    """
+    params = {
+        "access_key": getenv("MARKETSTACK_API_KEY"),
+        "symbols": ",".join(symbols),
+        "date_from": date_from.isoformat(),
+        "limit": PAGE_LIMIT,
+        "offset": 0,
+    }
+
+    bars: Dict[str, List[dict]] = {symbol: [] for symbol in symbols}
+    invalid: Dict[str, str] = {}
+    while True:
+        content = request(session, params)
+        for (symbol, error) in content["invalid"].items():
+            invalid.setdefault(symbol, error)
+
+        for bar in content["data"]:
+            bars.setdefault(bar["symbol"], []).append(bar)
+
+        pagination = content["pagination"]
+        params["offset"] += pagination["count"]
+        if pagination["count"] == 0 or params["offset"] >= pagination["total"]:
+            break
+
+    for symbol in invalid:
+        bars.pop(symbol, None)
+    latest = {
+        symbol: sorted(data, key=lambda bar: bar["date"], reverse=True)[:HISTORY_LIMIT]
+        for (symbol, data) in bars.items()
+    }
+    return (latest, invalid)
+
+
+def get_data(
+    symbols: Optional[List[Symbol]] = None,
+    batch_size: int = BATCH_SIZE,
+    max_workers: int = MAX_WORKERS,
+    incremental: bool = True,
+):
     """
     Download end-of-day data from Marketstack to json files in DATA_DIR
 
     Loops through symbols defined in symbols.py, skips downloading those
     symbols that have already been downloaded to limit api requests.
+
+    In incremental mode only bars after the last stored date of each
+    symbol are downloaded. They are merged with the stored history into
+    today's file and the earlier file is removed. Symbols without stored
+    history get HISTORY_DAYS of history.
+
+    The rest are requested batch_size symbols at a time, with max_workers
+    requests running concurrently over a pooled session. Symbols in one
+    batch share the same first date. Each symbol is saved to its own file
+    in the same format as Marketstack returns it.
+
+    Responses are validated and temporary failures retried, see request.
+    A batch that still fails does not stop the others, its symbols keep
+    their earlier files. So do symbols with invalid bars in a response.
+
+    :param symbols: market symbols to download, default is all symbols
+    :param batch_size: number of symbols in one request
+    :param max_workers: number of concurrent requests
+    :param incremental: download only bars after stored history
+    :returns: dictionary from marketstack symbol to error of the symbols
+     that could not be downloaded, also saved to FAILED_FILE
     """
     now = date.today()
+    if symbols is None:
+        symbols = catalog().symbols
 
     print("Getting data from {0}".format(MARKETSTACK_URL))
 
-    for (index, symbol) in enumerate(SYMBOLS):
+    # stored history of each symbol and symbols grouped by first date
+    previous_of = previous_files() if incremental else {}
+    history: Dict[str, Tuple[Optional[str], List[dict]]] = {}
+    groups: Dict[date, List[str]] = {}
+    for (index, symbol) in enumerate(symbols):
         filename = "{0}/{1}-{2}.json".format(DATA_DIR, now, symbol.symbol_marketstack)
         exists = path.isfile(filename)
 
         exists_text = "already exists " if exists else ""
         print(
             "{0} => {1} {2}({3}/{4})".format(
-                symbol.name, filename, exists_text, index + 1, len(SYMBOLS)
+                symbol.name, filename, exists_text, index + 1, len(symbols)
             )
         )
 
-        if not exists:
-            response = get(
-                MARKETSTACK_URL,
-                params={
-                    "access_key": getenv("MARKETSTACK_API_KEY"),
-                    "limit": 1000,
-                    "symbols": symbol.symbol_marketstack,
-                },
-            )
-            with open(filename, mode="w") as file:
-                file.write(response.text)
+        if exists or symbol.symbol_marketstack in history:
+            continue
+
+        previous = previous_of.get(symbol.symbol_marketstack)
+        bars = read_bars(previous) if previous else []
+        history[symbol.symbol_marketstack] = (previous, bars)
+
+        if bars:
+            date_from = date.fromisoformat(bars[0]["date"][:10]) + timedelta(days=1)
+        else:
+            date_from = now - timedelta(days=HISTORY_DAYS)
+        groups.setdefault(date_from, []).append(symbol.symbol_marketstack)
+
+    failed: Dict[str, str] = {}
+    batches = [
+        (date_from, missing[start : start + batch_size])
+        for (date_from, missing) in groups.items()
+        for start in range(0, len(missing), batch_size)
+    ]
+
+    with Session() as session:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(fetch_batch, session, batch, date_from): batch
+                for (date_from, batch) in batches
+            }
+            for future in as_completed(futures):
+                try:
+                    (result, invalid) = future.result()
+                except FetchError as e:
+                    # the rest are analyzed with what is stored, and these
+                    # are downloaded again on the next run
+                    print("{0} => failed: {1}".format(", ".join(futures[future]), e))
+                    count("failed_symbols", len(futures[future]))
+                    failed.update({symbol: str(e) for symbol in futures[future]})
+                    continue
+
+                for (symbol_marketstack, error) in invalid.items():
+                    print("{0} => failed: {1}".format(symbol_marketstack, error))
+                    count("failed_symbols")
+                    failed[symbol_marketstack] = error
+
+                for (symbol_marketstack, new) in result.items():
+                    (previous, old) = history.get(symbol_marketstack, (None, []))
+                    data = merge_bars(new, old)
+                    if not data:
+                        print("{0} => no data".format(symbol_marketstack))
+                        continue
+
+                    print(
+                        "{0} => {1} new bars".format(symbol_marketstack, len(new))
+                    )
+                    filename = "{0}/{1}-{2}.json".format(
+                        DATA_DIR, now, symbol_marketstack
+                    )
+                    # written to a temporary file first and renamed, so an
+                    # interrupted run never leaves a partial file
+                    with open(filename + ".tmp", mode="w") as file:
+                        file.write(json_dumps({"data": data}))
+                    replace(filename + ".tmp", filename)
+                    if previous:
+                        remove(previous)
+
+    save_failed(symbols, failed)
+
+    return failed
+
+
+def save_failed(symbols: List[Symbol], failed: Dict[str, str]):
+    """
+    Update FAILED_FILE with the results of downloading symbols
+
+    Failures of other symbols are kept, since workers of other shards can
+    be downloading at the same time, see shards.py. The file is updated
+    under a lock and written to a temporary file of this process first.
+
+    :param symbols: market symbols that were downloaded
+    :param failed: dictionary from marketstack symbol to error of the
+     symbols that could not be downloaded
+    """
+    makedirs(DATA_DIR, exist_ok=True)
+    with open(FAILED_FILE + ".lock", mode="a") as lock:
+        flock(lock, LOCK_EX)
+
+        saved: Dict[str, str] = {}
+        if path.isfile(FAILED_FILE):
+            with open(FAILED_FILE, mode="r") as file:
+                saved = json_loads(file.read())
+        downloaded = {symbol.symbol_marketstack for symbol in symbols}
+        saved = {
+            symbol: error
+            for (symbol, error) in saved.items()
+            if symbol not in downloaded
+        }
+        saved.update(failed)
+
+        (handle, tmp_filename) = mkstemp(dir=DATA_DIR, suffix=".tmp")
+        with fdopen(handle, mode="w") as file:
+            file.write(json_dumps(saved))
+        replace(tmp_filename, FAILED_FILE)
 
 
 def read_file(symbol: Symbol):
     """
     Read today's marketstack data file
 
+    Only the date and FIELDS are kept, other columns Marketstack returns
+    are not used in analysis.
+
     :param symbol: market symbol being read
     :returns: pandas dataframe indexed by date
     """
+    from pandas import DataFrame as pd_DataFrame, to_datetime as pd_to_datetime  # type: ignore
+
     now = date.today()
     filename = "{0}/{1}-{2}.json".format(DATA_DIR, now, symbol.symbol_marketstack)
     with open(filename, mode="r") as file:
-        raw = file.read()
+        # marketstack returns the latest bar first
+        data = json_loads(file.read())["data"][::-1]
 
-    df = pd_json_normalize(json_loads(raw), "data")
-    df["date"] = pd_to_datetime(df["date"])
-    df = df.set_index("date")
-    df = df.reindex(index=df.index[::-1])
-    return df
+    return pd_DataFrame(
+        {field: [bar[field] for bar in data] for field in FIELDS},
+        index=pd_to_datetime([bar["date"] for bar in data]).rename("date"),
+        dtype=float,
+    )
@@ -0,0 +1,299 @@
+from argparse import ArgumentParser
+from numpy import (  # type: ignore
+    arange,
+    argsort,
+    broadcast_to,
+    diff,
+    empty,
+    errstate,
+    full,
+    isnan,
+    isnat,
+    log,
+    maximum,
+    nan,
+    put_along_axis,
+    searchsorted,
+    sqrt,
+    triu_indices,
+    unique,
+    where,
+)
+from typing import Any, Iterator, List, NamedTuple, Tuple
+
+from analyze import WINDOW_SIZE_LONG
+from batch import Universe, compute, load
+from symbols import catalog
+
+# Indicators used by analyze_market
+MARKET_FIELDS = ["bb_upper", "bb_lower", "stoch_k", "ema_long", "ath_lower"]
+
+# Number of bars in a correlation window
+CORRELATION_WINDOW = 60
+
+# Minimum number of common bars for a pair of symbols to be correlated
+CORRELATION_MIN_BARS = 20
+
+# Number of symbols in a block of the correlation matrix, limits the size
+# of the intermediate arrays
+CORRELATION_BLOCK = 256
+
+# Number of most correlated symbols mentioned in a summary
+CORRELATED_COUNT = 3
+
+
+class Market(NamedTuple):
+    """
+    Cross-sectional analytics of a universe
+
+    Per-day arrays are on a common date axis, rows are the dates all
+    symbols together have bars for and columns are in universe order.
+    """
+
+    dates: Any
+    # percentile rank (0-1) of stochastic %K among symbols on each date
+    stoch_rank: Any
+    # percentile rank (0-1) of close within bollinger bands
+    bollinger_rank: Any
+    # share of symbols closing above EMA-long on each date
+    above_ema_long: Any
+    # share of symbols closing within all-time high range on each date
+    near_ath: Any
+    # symbols × symbols correlation of daily log returns, last window
+    correlation: Any
+
+
+def align(universe: Universe, values) -> Tuple[Any, Any]:
+    """
+    Move values of a universe from per-symbol bars to common dates
+
+    :param universe: universe with prices
+    :param values: bars × symbols array, like a price or an indicator
+    :returns (dates, aligned): a tuple with
+     - dates: sorted dates of all symbols
+     - aligned: dates × symbols array, NaN where a symbol has no bar
+    """
+    dates = unique(universe.dates[~isnat(universe.dates)])
+    # padding (NaT) goes to an extra row dropped at the end
+    rows = where(isnat(universe.dates), len(dates), searchsorted(dates, universe.dates))
+    columns = broadcast_to(arange(values.shape[1]), values.shape)
+
+    aligned = full((len(dates) + 1, values.shape[1]), nan)
+    aligned[rows, columns] = values
+    return (dates, aligned[:-1])
+
+
+def percentile_rank(values):
+    """
+    Rank of each value among the symbols on the same row
+
+    :param values: dates × symbols array
+    :returns: dates × symbols array from 0 (lowest) to 1 (highest), NaN
+     where the value is NaN
+    """
+    valid = ~isnan(values)
+    count = valid.sum(axis=1, keepdims=True)
+
+    # NaN sorts last, so valid values get ranks 0..count-1
+    ranks = empty(values.shape)
+    put_along_axis(
+        ranks,
+        argsort(values, axis=1),
+        broadcast_to(arange(values.shape[1], dtype=float), values.shape),
+        axis=1,
+    )
+    return where(valid, ranks / maximum(count - 1, 1), nan)
+
+
+def breadth(condition, valid):
+    """
+    Share of symbols for which condition holds on each row
+
+    :param condition: dates × symbols boolean array
+    :param valid: dates × symbols boolean array of symbols counted
+    :returns: array of shares, NaN on rows without valid symbols
+    """
+    with errstate(divide="ignore", invalid="ignore"):
+        return (condition & valid).sum(axis=1) / valid.sum(axis=1)
+
+
+def correlation(returns, block: int = CORRELATION_BLOCK):
+    """
+    Correlation matrix of returns, pairwise over the bars both symbols have
+
+    Computed in blocks of symbols with matrix products of the sums needed
+    for each pair, so there is no loop over pairs and memory use is
+    limited by block size.
+
+    :param returns: bars × symbols array
+    :param block: number of symbols in a block
+    :returns: symbols × symbols array, NaN for pairs with less than
+     CORRELATION_MIN_BARS common bars
+    """
+    valid = ~isnan(returns)
+    mask = valid.astype(float)
+    values = where(valid, returns, 0.0)
+    squares = values ** 2
+    symbols = returns.shape[1]
+
+    result = full((symbols, symbols), nan)
+    for i in range(0, symbols, block):
+        bi = slice(i, i + block)
+        for j in range(i, symbols, block):
+            bj = slice(j, j + block)
+            count = mask[:, bi].T @ mask[:, bj]
+            sum_x = values[:, bi].T @ mask[:, bj]
+            sum_y = mask[:, bi].T @ values[:, bj]
+            with errstate(divide="ignore", invalid="ignore"):
+                cov = values[:, bi].T @ values[:, bj] - sum_x * sum_y / count
+                var_x = squares[:, bi].T @ mask[:, bj] - sum_x ** 2 / count
+                var_y = mask[:, bi].T @ squares[:, bj] - sum_y ** 2 / count
+                corr = cov / sqrt(var_x * var_y)
+            corr[count < CORRELATION_MIN_BARS] = nan
+            result[bi, bj] = corr
+            result[bj, bi] = corr.T
+    return result
+
+
+def rolling_correlation(
+    returns, window: int = CORRELATION_WINDOW, step: int = 1
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Correlation matrices over a rolling window
+
+    :param returns: dates × symbols array
+    :param window: number of bars in a window
+    :param step: number of bars between windows
+    :returns: iterator of (last row of the window, correlation matrix),
+     ending at the last row
+    """
+    last = len(returns) - 1
+    for row in range(last - (last - window + 1) // step * step, last + 1, step):
+        yield (row, correlation(returns[row - window + 1 : row + 1]))
+
+
+def mean_correlation(matrix) -> float:
+    """
+    Mean correlation of all pairs of symbols, pairs without a correlation
+    left out
+
+    :param matrix: symbols × symbols correlation matrix
+    :returns: mean, NaN if no pair has a correlation
+    """
+    pairs = matrix[triu_indices(len(matrix), k=1)]
+    pairs = pairs[~isnan(pairs)]
+    return pairs.mean() if len(pairs) else nan
+
+
+def analyze_market(universe: Universe, indicators) -> Market:
+    """
+    Compute cross-sectional analytics for a universe
+
+    :param universe: universe with prices
+    :param indicators: indicators computed for the universe, see batch.compute
+    :returns: market analytics
+    """
+    close = universe.prices["close"]
+    with errstate(divide="ignore", invalid="ignore"):
+        bollinger = (close - indicators["bb_lower"]) / (
+            indicators["bb_upper"] - indicators["bb_lower"]
+        )
+
+    (dates, close) = align(universe, close)
+    (_, stoch_k) = align(universe, indicators["stoch_k"])
+    (_, bollinger) = align(universe, bollinger)
+    (_, ema_long) = align(universe, indicators["ema_long"])
+    (_, ath_lower) = align(universe, indicators["ath_lower"])
+
+    with errstate(invalid="ignore"):
+        above_ema_long = breadth(close > ema_long, ~isnan(close) & ~isnan(ema_long))
+        near_ath = breadth(close >= ath_lower, ~isnan(close) & ~isnan(ath_lower))
+        returns = diff(log(close), axis=0)
+
+    return Market(
+        dates,
+        percentile_rank(stoch_k),
+        percentile_rank(bollinger),
+        above_ema_long,
+        near_ath,
+        correlation(returns[-CORRELATION_WINDOW:]),
+    )
+
+
+def describe(market: Market, symbols: List, column: int) -> str:
+    """
+    Describe a symbol's position in the market, for adding to a summary
+
+    :param market: market analytics
+    :param symbols: symbols in universe order
+    :param column: index of the symbol
+    :returns: lines of text
+    """
+    text = ""
+    stoch_rank = market.stoch_rank[-1, column]
+    bollinger_rank = market.bollinger_rank[-1, column]
+    if not isnan(stoch_rank) and not isnan(bollinger_rank):
+        text += "- persentiili markkinassa: stokastinen %K {0:.0f}, ".format(
+            100 * stoch_rank
+        )
+        text += "bollinger {0:.0f}\n".format(100 * bollinger_rank)
+
+    correlations = market.correlation[column].copy()
+    correlations[column] = nan
+    ranked = [
+        index
+        for index in argsort(-correlations)[:CORRELATED_COUNT]
+        if not isnan(correlations[index])
+    ]
+    if ranked:
+        text += "- korreloi eniten: {0}\n".format(
+            ", ".join(
+                "{0} {1:.2f}".format(symbols[index].name, correlations[index])
+                for index in ranked
+            )
+        )
+
+    text += "- markkina: {0:.0f} % yli EMA-{1}, {2:.0f} % ATH-kaistalla\n".format(
+        100 * market.above_ema_long[-1], WINDOW_SIZE_LONG, 100 * market.near_ath[-1]
+    )
+    return text
+
+
+def main():
+    parser = ArgumentParser(description="Cross-sectional market analytics")
+    parser.add_argument(
+        "--days", type=int, default=10, help="number of days of breadth printed"
+    )
+    args = parser.parse_args()
+
+    universe = load(catalog().symbols)
+    market = analyze_market(universe, compute(universe, fields=MARKET_FIELDS))
+    days = min(args.days, len(market.dates))
+
+    # mean correlation of the window ending on each printed day, it rises
+    # when the whole market moves together
+    (_, close) = align(universe, universe.prices["close"])
+    with errstate(divide="ignore", invalid="ignore"):
+        returns = diff(log(close), axis=0)[-(days + CORRELATION_WINDOW - 1) :]
+    offset = len(market.dates) - len(returns)
+    correlations = {
+        market.dates[offset + row]: mean_correlation(matrix)
+        for (row, matrix) in rolling_correlation(returns)
+    }
+
+    print(
+        "date        above EMA-{0}  near ATH  correlation".format(WINDOW_SIZE_LONG)
+    )
+    for row in range(-days, 0):
+        print(
+            "{0}  {1:>13.0%}  {2:>8.0%}  {3:>11.2f}".format(
+                market.dates[row],
+                market.above_ema_long[row],
+                market.near_ath[row],
+                correlations.get(market.dates[row], nan),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
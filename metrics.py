@@ -0,0 +1,156 @@
+from contextlib import contextmanager
+from cProfile import Profile
+from datetime import datetime
+from json import dumps as json_dumps
+from os import getenv
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import DATA_DIR
+
+# Run summaries, one JSON object per line
+METRICS_FILE = "{0}/metrics.jsonl".format(DATA_DIR)
+
+# cProfile output of the profiled part of the run, enabled by setting
+# environment variable PROFILE=1
+PROFILE_FILE = "{0}/profile.prof".format(DATA_DIR)
+
+# timings and counters are updated from download threads too
+_lock = Lock()
+_timings: Dict[str, List[Tuple[Optional[str], float]]] = {}
+_counters: Dict[str, float] = {}
+
+
+def record(stage: str, seconds: float, symbol: Optional[str] = None):
+    """
+    Record duration of a stage
+
+    :param stage: stage name, for example "download" or "render"
+    :param seconds: duration
+    :param symbol: marketstack symbol if the stage was for one symbol
+    """
+    with _lock:
+        _timings.setdefault(stage, []).append((symbol, seconds))
+
+
+@contextmanager
+def timer(stage: str, symbol: Optional[str] = None) -> Iterator[None]:
+    """
+    Record duration of the with block as a stage
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, perf_counter() - start, symbol)
+
+
+def count(name: str, value: float = 1):
+    """
+    Increase a counter, for example "api_calls" or "bytes_downloaded"
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+@contextmanager
+def profile(enabled: Optional[bool] = None) -> Iterator[None]:
+    """
+    Profile the with block with cProfile and save stats to PROFILE_FILE
+
+    Only the current thread is profiled.
+
+    :param enabled: profile or not, default is environment variable PROFILE
+    """
+    if enabled is None:
+        enabled = getenv("PROFILE", "") not in ["", "0"]
+    if not enabled:
+        yield
+        return
+
+    profiler = Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(PROFILE_FILE)
+        print("Profile saved to {0}".format(PROFILE_FILE))
+
+
+def summary(run: str) -> List[dict]:
+    """
+    Summarize recorded timings and counters
+
+    :param run: name of the run, for example "run" or "bot"
+    :returns: list of records, one for each stage, counter and symbol timing
+    """
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    records = []
+    with _lock:
+        for (stage, timings) in _timings.items():
+            seconds = [duration for (_, duration) in timings]
+            (slowest_symbol, slowest) = max(timings, key=lambda timing: timing[1])
+            records.append(
+                {
+                    "run": run,
+                    "timestamp": timestamp,
+                    "type": "stage",
+                    "stage": stage,
+                    "count": len(seconds),
+                    "total": sum(seconds),
+                    "mean": sum(seconds) / len(seconds),
+                    "max": slowest,
+                    "max_symbol": slowest_symbol,
+                }
+            )
+        for (name, value) in _counters.items():
+            records.append(
+                {
+                    "run": run,
+                    "timestamp": timestamp,
+                    "type": "counter",
+                    "name": name,
+                    "value": value,
+                }
+            )
+        for (stage, timings) in _timings.items():
+            for (symbol, duration) in timings:
+                if symbol is not None:
+                    records.append(
+                        {
+                            "run": run,
+                            "timestamp": timestamp,
+                            "type": "symbol",
+                            "stage": stage,
+                            "symbol": symbol,
+                            "seconds": duration,
+                        }
+                    )
+    return records
+
+
+def write_summary(run: str):
+    """
+    Append summary of recorded timings and counters to METRICS_FILE
+
+    Stage totals are printed too.
+
+    :param run: name of the run, for example "run" or "bot"
+    """
+    records = summary(run)
+    with open(METRICS_FILE, mode="a") as file:
+        for record in records:
+            file.write(json_dumps(record) + "\n")
+
+    for record in records:
+        if record["type"] == "stage":
+            print(
+                "{0:<10} {1:>5} x {2:>8.3f} s".format(
+                    record["stage"], record["count"], record["total"]
+                )
+            )
+        elif record["type"] == "counter":
+            print("{0:<20} {1:>12}".format(record["name"], record["value"]))
+    print("Metrics appended to {0}".format(METRICS_FILE))
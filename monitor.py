@@ -0,0 +1,252 @@
+from argparse import ArgumentParser
+from copy import deepcopy
+from json import dumps as json_dumps, loads as json_loads
+from os import path, replace
+from socket import create_server
+from time import perf_counter, sleep
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from analyze import RULES, summarize
+from config import DATA_DIR
+from metrics import record
+from store import store_filename
+from stream import State, load_state, save_state, sync
+from symbols import Symbol, catalog
+
+# Seconds between checks for new lines when following a file
+POLL_INTERVAL = 0.1
+
+# Alerts already given, so that a restarted monitor does not alert them
+# again
+ALERTS_FILE = "{0}/monitor_alerts.json".format(DATA_DIR)
+
+
+def follow(filename: str, poll: float = POLL_INTERVAL) -> Iterator[dict]:
+    """
+    Read ticks from a file of JSON lines, waiting for new lines forever
+
+    Each line is a tick, either a trade
+    {"symbol": "ABB.XSTO", "date": "2021-02-01", "price": 1.0, "volume": 1}
+    or a bar with "open", "high", "low" and "close" instead of "price".
+
+    :param filename: file being appended to
+    :param poll: seconds between checks for new lines
+    :returns: iterator of ticks
+    """
+    with open(filename, mode="r") as file:
+        while True:
+            line = file.readline()
+            if not line:
+                sleep(poll)
+                continue
+            if line.strip():
+                yield json_loads(line)
+
+
+def listen(host: str, port: int) -> Iterator[dict]:
+    """
+    Read ticks as JSON lines from TCP connections, one connection at a time
+
+    :param host: address to listen on
+    :param port: port to listen on
+    :returns: iterator of ticks, see follow for the format
+    """
+    with create_server((host, port)) as server:
+        while True:
+            (connection, _) = server.accept()
+            with connection, connection.makefile(mode="r") as lines:
+                for line in lines:
+                    if line.strip():
+                        yield json_loads(line)
+
+
+def print_alert(symbol: Symbol, summary: str):
+    print(summary)
+
+
+class Monitor:
+    """
+    Evaluates highlighting rules on every tick during the trading day
+
+    Indicator states are synced from the store once and saved, so the next
+    start adds only bars stored after this one. Ticks build a
+    provisional bar for the day, and each tick evaluates the rules with a
+    copy of the state updated with the provisional bar, which takes
+    constant time. When ticks of a new day arrive, the previous day's bar
+    is added to the state for good.
+
+    Each rule alerts once per symbol and day, a rule firing again on
+    later ticks or after a restart is not alerted again. Symbols without
+    stored bars are not monitored.
+    """
+
+    def __init__(
+        self,
+        symbols: Optional[List[Symbol]] = None,
+        alert: Callable[[Symbol, str], None] = print_alert,
+        alerts_file: str = ALERTS_FILE,
+    ):
+        """
+        :param symbols: market symbols to monitor, default is all symbols
+        :param alert: called with symbol and summary when a rule fires
+        :param alerts_file: file of alerts already given
+        """
+        if symbols is None:
+            symbols = catalog().symbols
+        missing = [
+            symbol for symbol in symbols if not path.isfile(store_filename(symbol))
+        ]
+        for symbol in missing:
+            print("{0} => no stored data, not monitored".format(symbol.name))
+        symbols = [symbol for symbol in symbols if symbol not in missing]
+
+        self.symbols = {symbol.symbol_marketstack: symbol for symbol in symbols}
+        self.alert = alert
+        self.states: Dict[str, State] = {}
+        for symbol in symbols:
+            state = sync(symbol, load_state(symbol))
+            save_state(symbol, state)
+            self.states[symbol.symbol_marketstack] = state
+        # provisional bar of the current day for each symbol
+        self.bars: Dict[str, dict] = {}
+        # (marketstack symbol, date, rule name) already alerted
+        self.alerts_file = alerts_file
+        self.alerted: Set[Tuple[str, str, str]] = self._load_alerted()
+
+    def _load_alerted(self) -> Set[Tuple[str, str, str]]:
+        """
+        Read alerts already given for days not yet in the stored history
+        """
+        if not path.isfile(self.alerts_file):
+            return set()
+        with open(self.alerts_file, mode="r") as file:
+            alerted = json_loads(file.read())
+        return {
+            (symbol, day, name)
+            for (symbol, day, name) in alerted
+            if symbol in self.states
+            and (self.states[symbol].date is None or day > self.states[symbol].date)
+        }
+
+    def _save_alerted(self):
+        with open(self.alerts_file + ".tmp", mode="w") as file:
+            file.write(json_dumps(sorted(self.alerted)))
+        replace(self.alerts_file + ".tmp", self.alerts_file)
+
+    def _add_tick(self, tick: dict) -> Optional[dict]:
+        """
+        Update provisional bar of the tick's symbol
+        """
+        symbol = tick["symbol"]
+        state = self.states[symbol]
+        if state.date is not None and tick["date"] <= state.date:
+            # the day is already in the stored history
+            return None
+
+        bar = self.bars.get(symbol)
+        if bar is not None and tick["date"] > bar["date"]:
+            state.update(
+                bar["date"],
+                bar["open"],
+                bar["high"],
+                bar["low"],
+                bar["close"],
+                bar["volume"],
+            )
+            bar = None
+        elif bar is not None and tick["date"] < bar["date"]:
+            return None
+
+        if "price" in tick:
+            (opn, high, low, close) = [tick["price"]] * 4
+        else:
+            (opn, high, low, close) = (
+                tick["open"],
+                tick["high"],
+                tick["low"],
+                tick["close"],
+            )
+
+        if bar is None:
+            bar = {
+                "date": tick["date"],
+                "open": opn,
+                "high": high,
+                "low": low,
+                "close": close,
+                "volume": 0.0,
+            }
+        bar["high"] = max(bar["high"], high)
+        bar["low"] = min(bar["low"], low)
+        bar["close"] = close
+        bar["volume"] += tick.get("volume", 0.0)
+        self.bars[symbol] = bar
+        return bar
+
+    def on_tick(self, tick: dict) -> Optional[str]:
+        """
+        Process a tick and alert if a rule fires for the first time today
+
+        :param tick: tick, see follow for the format
+        :returns: summary if alerted, otherwise None
+        """
+        symbol_marketstack = tick["symbol"]
+        if symbol_marketstack not in self.symbols:
+            return None
+
+        start = perf_counter()
+        bar = self._add_tick(tick)
+        if bar is None:
+            return None
+
+        state = deepcopy(self.states[symbol_marketstack])
+        last = state.update(
+            bar["date"], bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"]
+        )
+        prev = state.prev
+
+        fired = [
+            (symbol_marketstack, bar["date"], name)
+            for (name, _, rule, _, _) in RULES
+            if rule(last, prev)
+        ]
+        new = [key for key in fired if key not in self.alerted]
+        record("monitor", perf_counter() - start, symbol_marketstack)
+        if not new:
+            return None
+
+        self.alerted.update(new)
+        self._save_alerted()
+        symbol = self.symbols[symbol_marketstack]
+        (_, summary) = summarize(symbol, last, prev)
+        self.alert(symbol, summary)
+        return summary
+
+    def run(self, ticks: Iterator[dict]):
+        """
+        Process ticks until the source ends
+
+        :param ticks: iterator of ticks, see follow and listen
+        """
+        for tick in ticks:
+            self.on_tick(tick)
+
+
+def main():
+    parser = ArgumentParser(description="Monitor highlighting rules on live ticks")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="follow ticks appended to a JSON lines file")
+    source.add_argument("--port", type=int, help="listen for ticks on a TCP port")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    args = parser.parse_args()
+
+    monitor = Monitor()
+    print("Monitoring {0} symbols".format(len(monitor.symbols)))
+    if args.file:
+        monitor.run(follow(args.file))
+    else:
+        monitor.run(listen(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from analyze import CHART_FIELDS, ChartProfile, chart_profile
+from batch import compute, load, select, to_dataframe
+from cache import cached_graph, key, put_graph, screen_cached
+from market import MARKET_FIELDS, analyze_market, describe as describe_market
+from metrics import profile, timer
+from render import render
+from store import ingest
+from symbols import Symbol
+from timeframes import describe, fired
+
+
+def download(symbols: List[Symbol]) -> Dict[str, str]:
+    """
+    Download data and convert it to the store
+
+    :param symbols: market symbols
+    :returns: dictionary from marketstack symbol to error of the symbols
+     that could not be downloaded, see get_data
+    """
+    from get_data import get_data
+
+    with timer("fetch"):
+        failed = get_data(symbols)
+    with timer("ingest"):
+        ingest(symbols)
+    return failed
+
+
+def highlights(
+    symbols: List[Symbol],
+    chart: Optional[ChartProfile] = None,
+    skip: Optional[Callable[[str], bool]] = None,
+    market: bool = False,
+) -> Iterator[Tuple[Symbol, str, str, str]]:
+    """
+    Analyze stored data of given symbols and draw graphs of highlighted ones
+
+    Progress and summaries of highlighted symbols are printed to terminal,
+    with the timeframes in which the rules agree. Results are cached, see
+    cache.py. Graphs drawn earlier are yielded first and the rest as soon
+    as each one is drawn, so they can be used while the rest are drawn.
+
+    :param symbols: market symbols
+    :param chart: chart profile, default is analyze.chart_profile(), graphs
+     cached with another profile are drawn again
+    :param skip: function from cache key to whether a highlighted symbol
+     is left out, like when it has already been posted
+    :param market: add the symbol's position in the market to summaries,
+     see market.py
+    :returns: iterator of (symbol, cache key, summary, graph filename)
+     tuples of highlighted symbols
+    """
+    if chart is None:
+        chart = chart_profile()
+
+    with profile():
+        with timer("load"):
+            universe = load(symbols)
+            keys = [key(symbol) for symbol in universe.symbols]
+
+        with timer("highlight"):
+            results = screen_cached(universe, keys)
+        if market:
+            with timer("market"):
+                analytics = analyze_market(
+                    universe, compute(universe, fields=MARKET_FIELDS)
+                )
+        with timer("timeframes"):
+            rules = fired(universe)
+
+        summaries = {}
+        cached = []
+        highlighted = []
+        for (index, (symbol, highlight, summary)) in enumerate(results):
+            print(
+                "{0} ({1}/{2})".format(symbol.name, index + 1, len(universe.symbols))
+            )
+            if not highlight or (skip is not None and skip(keys[index])):
+                continue
+
+            summary += "\n"
+            if market:
+                summary += describe_market(analytics, universe.symbols, index)
+            summary += describe(rules, index)
+            print(summary)
+            summaries[symbol] = (keys[index], summary)
+
+            graph = cached_graph(keys[index], chart)
+            if graph is None:
+                highlighted.append(index)
+            else:
+                print("{0} => {1} (cached)".format(symbol.name, graph))
+                cached.append((symbol, keys[index], summary, graph))
+
+        yield from cached
+        if not highlighted:
+            return
+
+        # full indicators are needed only for drawing the highlighted symbols
+        with timer("compute"):
+            universe = select(universe, highlighted)
+            indicators = compute(universe, fields=CHART_FIELDS)
+
+        items = (
+            (symbol, to_dataframe(universe, indicators, index))
+            for (index, symbol) in enumerate(universe.symbols)
+        )
+        for (symbol, filename) in render(items, profile=chart):
+            (cache_key, summary) = summaries[symbol]
+            graph = put_graph(cache_key, filename, chart)
+            print("{0} => {1}".format(symbol.name, filename))
+            yield (symbol, cache_key, summary, graph)
+
+
+def process(
+    symbols: List[Symbol], fetch: bool = True
+) -> List[Tuple[Symbol, str, str]]:
+    """
+    Fetch, analyze and draw given symbols, see download and highlights
+
+    :param symbols: market symbols
+    :param fetch: download data first, otherwise use what is stored
+    :returns: list of (symbol, summary, graph filename) tuples of
+     highlighted symbols
+    """
+    if fetch:
+        download(symbols)
+    else:
+        with timer("ingest"):
+            ingest(symbols)
+
+    return [
+        (symbol, summary, graph)
+        for (symbol, _, summary, graph) in highlights(symbols)
+    ]
@@ -0,0 +1,89 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_all_start_methods, get_context
+from os import path
+from time import perf_counter
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+from analyze import ChartProfile, chart_profile, draw
+from metrics import count, record
+from symbols import Symbol
+
+# Number of processes drawing graphs and maximum number of graphs being
+# drawn or waiting to be drawn at a time
+RENDER_WORKERS = 4
+RENDER_MAX_PENDING = 8
+
+# Rendering processes are started from a clean server process where it is
+# available, as forking copies the threads and locks of the caller, like
+# the event loop of bot.py or the download threads of get_data.py
+RENDER_START_METHOD = (
+    "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+)
+
+
+def _init_worker():
+    """
+    Use a non-interactive backend in rendering processes
+    """
+    from matplotlib import use  # type: ignore
+
+    use("Agg")
+
+
+def _draw(symbol: Symbol, df, profile: ChartProfile) -> Tuple[Symbol, str, float]:
+    start = perf_counter()
+    filename = draw(symbol, df, profile)
+    return (symbol, filename, perf_counter() - start)
+
+
+def render(
+    items: Iterable[Tuple[Symbol, Any]],
+    workers: int = RENDER_WORKERS,
+    max_pending: int = RENDER_MAX_PENDING,
+    profile: Optional[ChartProfile] = None,
+) -> Iterator[Tuple[Symbol, str]]:
+    """
+    Draw graphs for symbols in a process pool
+
+    Items are taken from the iterable only when there is room, so at most
+    max_pending dataframes and figures exist at a time. Results are
+    yielded in the order they complete, not in the order of items. Size
+    and drawing time of each graph are printed, and the total size is
+    counted as graph_bytes.
+
+    :param items: (symbol, df) tuples like the arguments of analyze.draw
+    :param workers: number of rendering processes
+    :param max_pending: maximum number of graphs in flight
+    :param profile: output profile, default is analyze.chart_profile()
+    :returns: iterator of (symbol, filename) tuples
+    """
+    if profile is None:
+        profile = chart_profile()
+    items = iter(items)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context(RENDER_START_METHOD),
+        initializer=_init_worker,
+    ) as pool:
+        pending = set()
+        while True:
+            for (symbol, df) in items:
+                pending.add(pool.submit(_draw, symbol, df, profile))
+                if len(pending) >= max_pending:
+                    break
+
+            if not pending:
+                return
+
+            (done, pending) = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                (symbol, filename, seconds) = future.result()
+                size = path.getsize(filename)
+                record("render", seconds, symbol.symbol_marketstack)
+                count("graph_bytes", size)
+                print(
+                    "{0} drawn in {1:.2f} s, {2:.0f} kB".format(
+                        symbol.name, seconds, size / 1024
+                    )
+                )
+                yield (symbol, filename)
@@ -1,15 +1,24 @@
-from analyze import analyze, draw
-from symbols import Symbol, SYMBOLS
+from os import getenv
 
-from get_data import get_data
+from cache import evict
+from metrics import write_summary
+from pipeline import process
+from symbols import catalog
 
 # Same as bot.py, but don't post anything to discord, only to terminal
 
-get_data()
 
-for (index, symbol) in enumerate(SYMBOLS):
-    print("{0} ({1}/{2})".format(symbol.name, index + 1, len(SYMBOLS)))
-    (df, highlight, explanation) = analyze(symbol)
-    if highlight:
-        print(explanation)
-        draw(symbol, df)
+def main():
+    # Optionally run only one exchange or watchlist, see symbols.py
+    symbols = catalog().select(
+        exchange=getenv("EXCHANGE"), watchlist=getenv("WATCHLIST")
+    )
+
+    process(symbols)
+
+    evict()
+    write_summary("run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from numpy import arange, argmax, errstate, fmax, full, isnan, nan  # type: ignore
+from numpy import nan_to_num  # type: ignore
+from typing import List, Tuple
+
+from analyze import WINDOW_SIZE_SHORT, WINDOW_SIZE_LONG, ALL_TIME_HIGH_RANGE, summarize
+from batch import Universe
+from symbols import Symbol
+
+
+def _ema_last(values, span: int):
+    """
+    Last value of pandas `ewm(span=span, adjust=False).mean()` per column
+
+    Uses the closed form of the recursion, a weighted sum over the column,
+    so the whole universe is one matrix-vector product instead of a loop
+    over bars. Columns may have leading NaN padding, and columns without
+    rows have no average, NaN.
+    """
+    if len(values) == 0:
+        return full(values.shape[1], nan)
+    alpha = 2 / (span + 1)
+    columns = arange(values.shape[1])
+    # decay[row] is (1 - alpha) ** (number of bars after row)
+    decay = (1 - alpha) ** arange(len(values) - 1, -1, -1)
+    first = argmax(~isnan(values), axis=0)
+    return alpha * (decay @ nan_to_num(values)) + (1 - alpha) * decay[first] * values[
+        first, columns
+    ]
+
+
+def screen(universe: Universe) -> List[Tuple[Symbol, bool, str]]:
+    """
+    Evaluate highlighting rules for every symbol without computing all
+    indicators
+
+    Only the values the rules use are computed, for the last two bars:
+    - bollinger bands from the last WINDOW_SIZE_SHORT bars
+    - trend from the previous ema_long, a weighted sum over the history
+    - all-time high band from the maximum of the history
+
+    Results are the same as from batch.evaluate, so full indicators can be
+    computed only for highlighted symbols when they are drawn.
+
+    :param universe: universe with prices
+    :returns: list of (symbol, highlight, summary) tuples in universe order
+    """
+    if len(universe.dates) == 0:
+        # no bars, like when all downloads of a run have failed
+        return [
+            (symbol, False, "{0}\n".format(symbol.name)) for symbol in universe.symbols
+        ]
+    prices = universe.prices
+    high = prices["high"]
+    low = prices["low"]
+
+    hl2 = (high[-WINDOW_SIZE_SHORT:] + low[-WINDOW_SIZE_SHORT:]) / 2
+    sma_short = hl2.mean(axis=0)
+    with errstate(invalid="ignore", divide="ignore"):
+        stdev_short = hl2.std(axis=0, ddof=1)
+
+    # ema_long - previous ema_long is alpha * (hl2 - previous ema_long)
+    ema_long_prev = _ema_last((high[:-1] + low[:-1]) / 2, WINDOW_SIZE_LONG)
+    ema_long_delta = 2 / (WINDOW_SIZE_LONG + 1) * (hl2[-1] - ema_long_prev)
+
+    ath_prev = fmax.reduce(high[: max(len(high) - 1, 1)], axis=0)
+    ath = fmax(ath_prev, high[-1])
+
+    # rules need two bars, a single bar compares with itself
+    prev_row = -2 if len(universe.dates) > 1 else -1
+
+    results = []
+    for (column, symbol) in enumerate(universe.symbols):
+        last = {
+            "open": prices["open"][-1, column],
+            "close": prices["close"][-1, column],
+            "high": high[-1, column],
+            "low": low[-1, column],
+            "ema_long_delta": ema_long_delta[column],
+            "bb_upper": sma_short[column] + 2 * stdev_short[column],
+            "bb_lower": sma_short[column] - 2 * stdev_short[column],
+            "ath_lower": ath[column] * ALL_TIME_HIGH_RANGE,
+        }
+        prev = {
+            "close": prices["close"][prev_row, column],
+            "ath_lower": ath_prev[column] * ALL_TIME_HIGH_RANGE,
+        }
+        (highlight, summary) = summarize(symbol, last, prev)
+        results.append((symbol, highlight, summary))
+    return results
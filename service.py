@@ -0,0 +1,337 @@
+from argparse import ArgumentParser
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps as json_dumps
+from numpy import isnan, isnat  # type: ignore
+from os import path
+from re import fullmatch
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from analyze import RULES
+from batch import compute, load
+from store import FIELDS, store_filename
+from symbols import Symbol, catalog
+
+# Address the service listens on
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8000
+
+# Seconds between checks for symbols ingested to the store
+REFRESH_INTERVAL = 5.0
+
+# Number of days in a series when not given
+SERIES_DAYS = 20
+
+# Comparisons in where conditions
+OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    "<=": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+}
+
+
+class QueryError(Exception):
+    """
+    Invalid query, answered with HTTP 400
+    """
+
+
+def _value(value) -> Any:
+    """
+    JSON value of a number, NaN is null
+    """
+    value = float(value)
+    return None if isnan(value) else value
+
+
+class History:
+    """
+    Stored bars and indicators of one symbol as 1-D arrays
+    """
+
+    def __init__(self, dates, values: Dict[str, Any], mtime: float):
+        self.dates = dates
+        self.values = values
+        self.mtime = mtime
+
+    def bar(self, row: int) -> Dict[str, Any]:
+        return {name: values[row] for (name, values) in self.values.items()}
+
+    def latest(self) -> Dict[str, Any]:
+        """
+        Latest bar with prices, indicators and fired highlighting rules
+        """
+        last = self.bar(-1)
+        # rules need two bars, a single bar compares with itself
+        prev = self.bar(-2) if len(self.dates) > 1 else last
+        latest = {name: _value(value) for (name, value) in last.items()}
+        latest["date"] = str(self.dates[-1])
+        latest["signals"] = [
+            name for (name, _, rule, _, _) in RULES if rule(last, prev)
+        ]
+        return latest
+
+
+class Service:
+    """
+    Latest indicators and signals of all symbols, kept in memory
+
+    Stored bars are loaded and indicators computed once. The store is
+    checked for new data at most every REFRESH_INTERVAL seconds, and only
+    symbols whose store file has changed are loaded and computed again.
+    """
+
+    def __init__(self, symbols: Optional[List[Symbol]] = None):
+        """
+        :param symbols: market symbols served, default is all symbols
+        """
+        self.symbols = {
+            symbol.symbol_marketstack: symbol
+            for symbol in (catalog().symbols if symbols is None else symbols)
+        }
+        self.histories: Dict[str, History] = {}
+        self.latest: Dict[str, Dict[str, Any]] = {}
+        self.fields: List[str] = list(FIELDS)
+        self.refreshed: Optional[datetime] = None
+        self.checked = 0.0
+        self.lock = Lock()
+        self.refresh()
+
+    def refresh(self, force: bool = True) -> int:
+        """
+        Load and compute symbols ingested since the last refresh
+
+        :param force: check the store even if REFRESH_INTERVAL has not
+         passed since the last check
+        :returns: number of symbols refreshed
+        """
+        # queries read histories and latest without the lock, so they are
+        # replaced with updated copies instead of being modified
+        with self.lock:
+            if not force and monotonic() - self.checked < REFRESH_INTERVAL:
+                return 0
+            self.checked = monotonic()
+
+            changed = []
+            mtimes = {}
+            for (name, symbol) in self.symbols.items():
+                filename = store_filename(symbol)
+                if not path.isfile(filename):
+                    continue
+                mtimes[name] = path.getmtime(filename)
+                history = self.histories.get(name)
+                if history is None or history.mtime != mtimes[name]:
+                    changed.append(symbol)
+            if not changed:
+                return 0
+
+            universe = load(changed)
+            arrays = dict(universe.prices)
+            arrays.update(compute(universe))
+
+            histories = dict(self.histories)
+            latest = dict(self.latest)
+            for (column, symbol) in enumerate(universe.symbols):
+                dates = universe.dates[:, column]
+                valid = ~isnat(dates)
+                values = {
+                    name: array[valid, column] for (name, array) in arrays.items()
+                }
+                history = History(
+                    dates[valid], values, mtimes[symbol.symbol_marketstack]
+                )
+                histories[symbol.symbol_marketstack] = history
+                latest[symbol.symbol_marketstack] = history.latest()
+
+            (self.histories, self.latest) = (histories, latest)
+            self.fields = list(arrays)
+            self.refreshed = datetime.now()
+            print("Refreshed {0} symbols".format(len(universe.symbols)))
+            return len(universe.symbols)
+
+    def _condition(self, condition: str) -> Callable[[Dict[str, Any]], bool]:
+        """
+        Parse a where condition like "close>bb_upper" or "stoch_k<0.2"
+        """
+        match = fullmatch(r"\s*(\w+)\s*(<=|>=|==|!=|<|>)\s*([\w.+-]+)\s*", condition)
+        if match is None:
+            raise QueryError("invalid condition {0}".format(condition))
+        (left, operator, right) = match.groups()
+        fields = self.fields
+        if left not in fields:
+            raise QueryError("unknown field {0}".format(left))
+
+        compare = OPERATORS[operator]
+        if right in fields:
+            return lambda latest: (
+                latest[left] is not None
+                and latest[right] is not None
+                and compare(latest[left], latest[right])
+            )
+        try:
+            number = float(right)
+        except ValueError:
+            raise QueryError("unknown field {0}".format(right))
+        return lambda latest: (
+            latest[left] is not None and compare(latest[left], number)
+        )
+
+    def query(
+        self, where: Optional[List[str]] = None, signal: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Latest values of symbols matching all conditions
+
+        :param where: conditions like "close>bb_upper" or "stoch_k<0.2",
+         comparing fields to fields or numbers
+        :param signal: only symbols for which this rule fired, "any" for
+         any rule
+        :returns: list of latest values with symbol and name
+        """
+        conditions = [self._condition(condition) for condition in where or []]
+        results = []
+        for (name, latest) in self.latest.items():
+            if signal == "any" and not latest["signals"]:
+                continue
+            if signal not in [None, "any"] and signal not in latest["signals"]:
+                continue
+            if all(condition(latest) for condition in conditions):
+                results.append(
+                    dict(latest, symbol=name, name=self.symbols[name].name)
+                )
+        return results
+
+    def series(
+        self, symbol: str, fields: List[str], days: int = SERIES_DAYS
+    ) -> Dict[str, List]:
+        """
+        Values of a symbol over the last days
+
+        :param symbol: marketstack symbol
+        :param fields: price and indicator fields
+        :param days: number of latest bars
+        :returns: dictionary from "date" and each field to a list of values
+        """
+        history = self.histories.get(symbol)
+        if history is None:
+            raise KeyError(symbol)
+        unknown = [field for field in fields if field not in history.values]
+        if unknown:
+            raise QueryError("unknown fields {0}".format(", ".join(unknown)))
+
+        series: Dict[str, List] = {
+            "date": [str(day) for day in history.dates[-days:]]
+        }
+        for field in fields:
+            series[field] = [
+                _value(value) for value in history.values[field][-days:]
+            ]
+        return series
+
+
+def _handler(service: Service):
+    class Handler(BaseHTTPRequestHandler):
+        """
+        GET /health
+        GET /symbols?where=close>bb_upper&where=stoch_k>0.8&signal=any
+        GET /symbols/ABB.XSTO
+        GET /symbols/ABB.XSTO/series?fields=close,stoch_k&days=20
+        GET /fields
+        """
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, content: Any):
+            body = json_dumps(content).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _route(self) -> Tuple[int, Any]:
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            parts = [unquote(part) for part in url.path.strip("/").split("/")]
+
+            service.refresh(force=False)
+
+            if parts == ["health"]:
+                refreshed = service.refreshed
+                health: Dict[str, Any] = {
+                    "symbols": len(service.latest),
+                    "refreshed": None,
+                }
+                if refreshed is not None:
+                    health["refreshed"] = refreshed.isoformat(timespec="seconds")
+                return (200, health)
+            if parts == ["fields"]:
+                return (200, service.fields)
+            if parts == ["symbols"]:
+                return (
+                    200,
+                    service.query(
+                        params.get("where", []), params.get("signal", [None])[0]
+                    ),
+                )
+            if len(parts) == 2 and parts[0] == "symbols":
+                if parts[1] not in service.latest:
+                    return (404, {"error": "unknown symbol {0}".format(parts[1])})
+                return (200, dict(service.latest[parts[1]], symbol=parts[1]))
+            if len(parts) == 3 and parts[0] == "symbols" and parts[2] == "series":
+                if parts[1] not in service.histories:
+                    return (404, {"error": "unknown symbol {0}".format(parts[1])})
+                fields = ",".join(params.get("fields", ["close"])).split(",")
+                days = int(params.get("days", [SERIES_DAYS])[0])
+                return (200, service.series(parts[1], fields, days))
+            return (404, {"error": "not found"})
+
+        def do_GET(self):
+            try:
+                (status, content) = self._route()
+            except (QueryError, ValueError) as e:
+                (status, content) = (400, {"error": str(e)})
+            self._send(status, content)
+
+    return Handler
+
+
+def serve(service: Service, host: str = SERVICE_HOST, port: int = SERVICE_PORT):
+    """
+    Answer queries over HTTP until interrupted
+
+    :param service: service with loaded symbols
+    :param host: address to listen on
+    :param port: port to listen on
+    """
+    with ThreadingHTTPServer((host, port), _handler(service)) as server:
+        print(
+            "Serving {0} symbols on http://{1}:{2}/".format(
+                len(service.latest), host, port
+            )
+        )
+        server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = ArgumentParser(
+        description="Serve latest indicators and signals as JSON over HTTP"
+    )
+    parser.add_argument("--host", default=SERVICE_HOST, help="address to listen on")
+    parser.add_argument(
+        "--port", type=int, default=SERVICE_PORT, help="port to listen on"
+    )
+    args = parser.parse_args(argv)
+
+    serve(Service(), args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
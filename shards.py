@@ -0,0 +1,341 @@
+from argparse import ArgumentParser
+from datetime import date
+from json import dumps as json_dumps, loads as json_loads
+from os import getenv, getpid
+from socket import gethostname
+from sqlite3 import connect
+from subprocess import Popen
+from sys import executable, exit
+from time import sleep, time
+from traceback import print_exc
+from typing import List, Optional, Tuple
+
+from config import DATA_DIR
+from symbols import Symbol, catalog
+
+# SQLite database of the shard queue. Workers on other hosts can use a
+# database on a shared filesystem.
+SHARDS_DB = getenv("SHARDS_DB", "{0}/shards.sqlite".format(DATA_DIR))
+
+# Number of symbols in one shard
+SHARD_SIZE = 20
+
+# Shards running longer than this are considered lost with their worker
+# and are queued again
+SHARD_TIMEOUT = 30 * 60
+
+# A shard that has been taken this many times without completing is
+# marked failed instead of being queued again
+SHARD_MAX_ATTEMPTS = 3
+
+# Number of times the coordinator restarts its local workers after they
+# have exited with shards left
+WORKER_RESTARTS = 3
+
+# Seconds between checks of the queue
+POLL_INTERVAL = 1.0
+
+
+def _connect():
+    db = connect(SHARDS_DB, timeout=60, isolation_level=None)
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS shards (
+            run TEXT,
+            id INTEGER,
+            symbols TEXT,
+            status TEXT,
+            worker TEXT,
+            started REAL,
+            attempts INTEGER DEFAULT 0,
+            PRIMARY KEY (run, id)
+        )
+        """
+    )
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS results (
+            run TEXT,
+            symbol TEXT,
+            summary TEXT,
+            graph TEXT,
+            PRIMARY KEY (run, symbol)
+        )
+        """
+    )
+    return db
+
+
+def create(run: str, symbols: List[Symbol], shard_size: int = SHARD_SIZE):
+    """
+    Partition symbols to shards and queue them
+
+    Queuing the same run again does nothing, so a restarted coordinator
+    continues where it was.
+
+    :param run: name of the run, for example today's date
+    :param symbols: market symbols
+    :param shard_size: number of symbols in one shard
+    """
+    db = _connect()
+    with db:
+        db.execute("BEGIN IMMEDIATE")
+        if db.execute("SELECT 1 FROM shards WHERE run = ?", (run,)).fetchone():
+            return
+        for (index, start) in enumerate(range(0, len(symbols), shard_size)):
+            shard = [
+                symbol.symbol_marketstack
+                for symbol in symbols[start : start + shard_size]
+            ]
+            db.execute(
+                "INSERT INTO shards (run, id, symbols, status) VALUES (?, ?, ?, ?)",
+                (run, index, json_dumps(shard), "pending"),
+            )
+
+
+def claim(run: str, worker: str) -> Optional[Tuple[int, List[Symbol]]]:
+    """
+    Take a pending shard for a worker
+
+    Shards that have been running longer than SHARD_TIMEOUT are taken
+    again, their worker is assumed to have crashed, or marked failed if
+    they have been taken SHARD_MAX_ATTEMPTS times already.
+
+    :param run: name of the run
+    :param worker: worker name
+    :returns: (shard id, symbols) or None if no shard can be taken now
+    """
+    db = _connect()
+    with db:
+        db.execute("BEGIN IMMEDIATE")
+        db.execute(
+            """
+            UPDATE shards SET status = 'failed'
+            WHERE run = ? AND status = 'running' AND started < ? AND attempts >= ?
+            """,
+            (run, time() - SHARD_TIMEOUT, SHARD_MAX_ATTEMPTS),
+        )
+        row = db.execute(
+            """
+            SELECT id, symbols FROM shards
+            WHERE run = ? AND (status = 'pending' OR (status = 'running' AND started < ?))
+            ORDER BY id LIMIT 1
+            """,
+            (run, time() - SHARD_TIMEOUT),
+        ).fetchone()
+        if row is None:
+            return None
+        db.execute(
+            """
+            UPDATE shards SET status = 'running', worker = ?, started = ?,
+            attempts = attempts + 1 WHERE run = ? AND id = ?
+            """,
+            (worker, time(), run, row[0]),
+        )
+    return (row[0], [catalog().by_marketstack[symbol] for symbol in json_loads(row[1])])
+
+
+def complete(run: str, shard: int, highlights: List[Tuple[Symbol, str, str]]):
+    """
+    Save results of a shard and mark it done
+
+    :param run: name of the run
+    :param shard: shard id
+    :param highlights: list of (symbol, summary, graph filename) tuples
+    """
+    db = _connect()
+    with db:
+        db.execute("BEGIN IMMEDIATE")
+        db.executemany(
+            "INSERT OR REPLACE INTO results (run, symbol, summary, graph) VALUES (?, ?, ?, ?)",
+            [
+                (run, symbol.symbol_marketstack, summary, graph)
+                for (symbol, summary, graph) in highlights
+            ],
+        )
+        db.execute(
+            "UPDATE shards SET status = 'done' WHERE run = ? AND id = ?", (run, shard)
+        )
+
+
+def release(run: str, shard: int):
+    """
+    Queue a shard again after its processing failed, or mark it failed
+    if it has been taken SHARD_MAX_ATTEMPTS times
+
+    :param run: name of the run
+    :param shard: shard id
+    """
+    db = _connect()
+    with db:
+        db.execute(
+            """
+            UPDATE shards
+            SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END
+            WHERE run = ? AND id = ?
+            """,
+            (SHARD_MAX_ATTEMPTS, run, shard),
+        )
+
+
+def unfinished(run: str) -> int:
+    """
+    Number of shards of a run that are pending or running
+
+    :param run: name of the run
+    """
+    db = _connect()
+    (left,) = db.execute(
+        """
+        SELECT COUNT(*) FROM shards
+        WHERE run = ? AND status IN ('pending', 'running')
+        """,
+        (run,),
+    ).fetchone()
+    return left
+
+
+def work(run: str):
+    """
+    Process shards of a run until all of them are done or failed
+
+    While other workers are running the last shards, the queue is polled
+    so that shards of crashed workers are taken after SHARD_TIMEOUT.
+
+    :param run: name of the run
+    """
+    from pipeline import process
+
+    worker = "{0}:{1}".format(gethostname(), getpid())
+    while True:
+        claimed = claim(run, worker)
+        if claimed is None:
+            if unfinished(run) == 0:
+                return
+            sleep(POLL_INTERVAL)
+            continue
+        (shard, symbols) = claimed
+        print(
+            "{0} processing shard {1} ({2} symbols)".format(worker, shard, len(symbols))
+        )
+        try:
+            highlights = process(symbols)
+        except Exception:
+            print_exc()
+            release(run, shard)
+            continue
+        complete(run, shard, highlights)
+
+
+def _start_worker(run: str) -> Popen:
+    return Popen([executable, __file__, "work", "--run", run])
+
+
+def wait(run: str, workers: Optional[List[Popen]] = None):
+    """
+    Wait until all shards of a run are done or failed
+
+    Local workers that exit while shards are left are restarted, at most
+    WORKER_RESTARTS times in total.
+
+    :param run: name of the run
+    :param workers: local worker processes, none if all workers are remote
+    :raises RuntimeError: if all local workers have exited with shards
+     left and they cannot be restarted anymore
+    """
+    workers = workers if workers is not None else []
+    restarts = 0
+    while unfinished(run) > 0:
+        for (index, process) in enumerate(workers):
+            if process.poll() is None:
+                continue
+            if restarts < WORKER_RESTARTS:
+                print(
+                    "Worker exited with status {0}, restarting".format(
+                        process.returncode
+                    )
+                )
+                workers[index] = _start_worker(run)
+                restarts += 1
+        if workers and all(process.poll() is not None for process in workers):
+            if unfinished(run) == 0:
+                return
+            raise RuntimeError(
+                "all workers have exited with {0} shards left".format(unfinished(run))
+            )
+        sleep(POLL_INTERVAL)
+
+
+def report(run: str) -> List[Tuple[str, str, str]]:
+    """
+    Merged highlights of all shards of a run
+
+    :param run: name of the run
+    :returns: list of (marketstack symbol, summary, graph filename) tuples
+    """
+    db = _connect()
+    return db.execute(
+        "SELECT symbol, summary, graph FROM results WHERE run = ? ORDER BY symbol",
+        (run,),
+    ).fetchall()
+
+
+def failed(run: str) -> List[str]:
+    """
+    Symbols of failed shards of a run
+
+    :param run: name of the run
+    :returns: list of marketstack symbols
+    """
+    db = _connect()
+    rows = db.execute(
+        "SELECT symbols FROM shards WHERE run = ? AND status = 'failed' ORDER BY id",
+        (run,),
+    ).fetchall()
+    return [symbol for (symbols,) in rows for symbol in json_loads(symbols)]
+
+
+def main():
+    parser = ArgumentParser(description="Run analysis in shards over worker processes")
+    parser.add_argument("role", choices=["coordinate", "work"])
+    parser.add_argument(
+        "--run", default=date.today().isoformat(), help="name of the run"
+    )
+    parser.add_argument(
+        "--shard-size", type=int, default=SHARD_SIZE, help="symbols in one shard"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="number of local worker processes started by the coordinator",
+    )
+    parser.add_argument("--exchange", help="only symbols of this exchange")
+    parser.add_argument("--watchlist", help="only symbols in this watchlist")
+    args = parser.parse_args()
+
+    if args.role == "work":
+        work(args.run)
+        return
+
+    try:
+        symbols = catalog().select(exchange=args.exchange, watchlist=args.watchlist)
+    except ValueError as e:
+        parser.error(str(e))
+    create(args.run, symbols, args.shard_size)
+    workers = [_start_worker(args.run) for _ in range(args.workers)]
+    wait(args.run, workers)
+    for process in workers:
+        process.wait()
+
+    for (symbol, summary, graph) in report(args.run):
+        print(summary)
+        print("{0} => {1}".format(symbol, graph))
+    failed_symbols = failed(args.run)
+    if failed_symbols:
+        print("Failed shards with symbols {0}".format(", ".join(failed_symbols)))
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
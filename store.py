@@ -0,0 +1,90 @@
+from datetime import date
+from json import loads as json_loads
+from numpy import array, load as np_load, save as np_save  # type: ignore
+from os import makedirs, path, replace
+from typing import List, Optional
+
+from config import DATA_DIR, FIELDS
+from metrics import timer
+from symbols import Symbol, catalog
+
+# Directory for the price store, one file of bars sorted by date per symbol
+STORE_DIR = "{0}/store".format(DATA_DIR)
+
+# Record type of a stored bar
+DTYPE = [("date", "datetime64[D]")] + [(field, "f8") for field in FIELDS]
+
+
+def store_filename(symbol: Symbol) -> str:
+    return "{0}/{1}.npy".format(STORE_DIR, symbol.symbol_marketstack)
+
+
+def convert(raw_filename: str, filename: str):
+    """
+    Convert a marketstack data file to a stored array of bars
+
+    The array is written to a temporary file first and renamed, so a
+    reader never sees a partially written file.
+
+    :param raw_filename: marketstack data file
+    :param filename: store file
+    """
+    with open(raw_filename, mode="r") as file:
+        # marketstack returns the latest bar first
+        data = json_loads(file.read())["data"][::-1]
+
+    bars = array(
+        [(bar["date"][:10],) + tuple(bar[field] for field in FIELDS) for bar in data],
+        dtype=DTYPE,
+    )
+
+    tmp_filename = "{0}.tmp.npy".format(filename[: -len(".npy")])
+    np_save(tmp_filename, bars)
+    replace(tmp_filename, filename)
+
+
+def ingest(symbols: Optional[List[Symbol]] = None):
+    """
+    Convert today's marketstack data files to the store in STORE_DIR
+
+    Symbols whose stored array is already newer than the data file are
+    skipped, so this is cheap to run after every download. Invalid data
+    files are reported and skipped.
+
+    :param symbols: market symbols to convert, default is all symbols
+    """
+    now = date.today()
+    if symbols is None:
+        symbols = catalog().symbols
+    makedirs(STORE_DIR, exist_ok=True)
+
+    for symbol in symbols:
+        raw_filename = "{0}/{1}-{2}.json".format(
+            DATA_DIR, now, symbol.symbol_marketstack
+        )
+        filename = store_filename(symbol)
+        if not path.isfile(raw_filename):
+            continue
+        if path.isfile(filename) and path.getmtime(filename) >= path.getmtime(
+            raw_filename
+        ):
+            continue
+        try:
+            with timer("json_parse", symbol.symbol_marketstack):
+                convert(raw_filename, filename)
+        except (KeyError, TypeError, ValueError) as e:
+            # keep the earlier stored bars and continue with the rest
+            print("{0} => invalid data file: {1}".format(raw_filename, e))
+
+
+def read(symbol: Symbol):
+    """
+    Read stored bars of a symbol
+
+    The file is memory-mapped, so fields are read from disk only when
+    they are accessed.
+
+    :param symbol: market symbol being read
+    :returns: numpy record array of bars sorted by date, see DTYPE
+    """
+    return np_load(store_filename(symbol), mmap_mode="r")
@@ -0,0 +1,340 @@
+from collections import deque
+from json import dumps as json_dumps, loads as json_loads
+from math import copysign, inf, isnan, nan, sqrt
+from numpy import datetime64  # type: ignore
+from os import path, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from analyze import (
+    WINDOW_SIZE_SHORT,
+    WINDOW_SIZE_LONG,
+    STOCHASTIC_WINDOW_SIZE_K,
+    STOCHASTIC_WINDOW_SIZE_K_SMOOTH,
+    STOCHASTIC_WINDOW_SIZE_D,
+    ALL_TIME_HIGH_RANGE,
+    summarize,
+)
+from config import HISTORY_LIMIT
+from store import STORE_DIR, read, store_filename
+from symbols import Symbol, catalog
+
+
+class State:
+    """
+    Indicator state of one symbol that is updated one bar at a time
+
+    Every update takes constant time regardless of history length:
+    - sma_short, sma_long and stdev_short use running sums over the
+      window (shifted by the first hl2 value to keep sums of squares
+      small)
+    - ema_short and ema_long carry the previous value
+    - stochastic highest and lowest use monotonic deques
+    - ath uses a monotonic deque too, it is the highest high of the last
+      HISTORY_LIMIT bars, the history that is stored
+
+    Results are the same as from analyze.analyze and batch.compute on the
+    stored history within float tolerance. `last` and `prev` hold prices
+    and indicators of the two latest bars in the same form as the
+    dataframe columns. Like in batch.compute, ath of `prev` is over the
+    same stored history as ath of `last`.
+    """
+
+    def __init__(self):
+        self.date: Optional[str] = None
+        self.count = 0
+        self.shift = nan
+        self.hl2_short: deque = deque()
+        self.hl2_long: deque = deque()
+        self.sum_short = 0.0
+        self.sumsq_short = 0.0
+        self.sum_long = 0.0
+        self.ema_short = nan
+        self.ema_long = nan
+        # [index, value] pairs, values decreasing for highs and increasing for lows
+        self.highs: deque = deque()
+        self.lows: deque = deque()
+        self.stoch_k_raw: deque = deque()
+        self.stoch_k: deque = deque()
+        # [index, high] pairs of the previous bars in the stored history,
+        # highs decreasing
+        self.ath_highs: deque = deque()
+        self.last: Dict[str, float] = {}
+        self.prev: Dict[str, float] = {}
+
+    def update(
+        self, day: str, opn: float, high: float, low: float, close: float, volume: float
+    ) -> Dict[str, float]:
+        """
+        Add a new bar and update indicators
+
+        :param day: date of the bar as an ISO string, must be after the
+         previous bar
+        :param opn: open price
+        :param high: high price
+        :param low: low price
+        :param close: close price
+        :param volume: volume
+        :returns: prices and indicators of the new bar
+        """
+        if self.date is not None and day <= self.date:
+            raise ValueError(
+                "Bar {0} is not after the last bar {1}".format(day, self.date)
+            )
+
+        index = self.count
+        self.date = day
+        self.count += 1
+
+        hl2 = (high + low) / 2
+        if isnan(self.shift):
+            self.shift = hl2
+        value = hl2 - self.shift
+
+        # simple moving averages and standard deviation
+        self.hl2_short.append(value)
+        self.sum_short += value
+        self.sumsq_short += value * value
+        if len(self.hl2_short) > WINDOW_SIZE_SHORT:
+            old = self.hl2_short.popleft()
+            self.sum_short -= old
+            self.sumsq_short -= old * old
+
+        self.hl2_long.append(value)
+        self.sum_long += value
+        if len(self.hl2_long) > WINDOW_SIZE_LONG:
+            self.sum_long -= self.hl2_long.popleft()
+
+        sma_short = nan
+        stdev_short = nan
+        if len(self.hl2_short) == WINDOW_SIZE_SHORT:
+            sma_short = self.shift + self.sum_short / WINDOW_SIZE_SHORT
+            variance = (
+                self.sumsq_short - self.sum_short * self.sum_short / WINDOW_SIZE_SHORT
+            ) / (WINDOW_SIZE_SHORT - 1)
+            stdev_short = sqrt(max(variance, 0.0))
+
+        sma_long = nan
+        if len(self.hl2_long) == WINDOW_SIZE_LONG:
+            sma_long = self.shift + self.sum_long / WINDOW_SIZE_LONG
+
+        # exponential moving averages
+        ema_long_prev = self.ema_long
+        self.ema_short = _ewm_step(self.ema_short, hl2, WINDOW_SIZE_SHORT)
+        self.ema_long = _ewm_step(self.ema_long, hl2, WINDOW_SIZE_LONG)
+
+        # stochastic
+        while self.highs and self.highs[-1][1] <= high:
+            self.highs.pop()
+        self.highs.append([index, high])
+        while self.highs[0][0] <= index - STOCHASTIC_WINDOW_SIZE_K:
+            self.highs.popleft()
+
+        while self.lows and self.lows[-1][1] >= low:
+            self.lows.pop()
+        self.lows.append([index, low])
+        while self.lows[0][0] <= index - STOCHASTIC_WINDOW_SIZE_K:
+            self.lows.popleft()
+
+        stoch_k_highest = nan
+        stoch_k_lowest = nan
+        stoch_k_raw = nan
+        if self.count >= STOCHASTIC_WINDOW_SIZE_K:
+            stoch_k_highest = self.highs[0][1]
+            stoch_k_lowest = self.lows[0][1]
+            if stoch_k_highest != stoch_k_lowest:
+                stoch_k_raw = (close - stoch_k_lowest) / (
+                    stoch_k_highest - stoch_k_lowest
+                )
+            elif close != stoch_k_lowest:
+                stoch_k_raw = copysign(inf, close - stoch_k_lowest)
+
+        stoch_k = _window_mean(
+            self.stoch_k_raw, stoch_k_raw, STOCHASTIC_WINDOW_SIZE_K_SMOOTH
+        )
+        stoch_d = _window_mean(self.stoch_k, stoch_k, STOCHASTIC_WINDOW_SIZE_D)
+
+        # all-time high over the stored history, the oldest bar drops off
+        # when a new bar is added
+        while self.ath_highs and self.ath_highs[0][0] <= index - HISTORY_LIMIT:
+            self.ath_highs.popleft()
+        ath = high
+        if self.ath_highs:
+            ath = max(self.ath_highs[0][1], high)
+            if self.last:
+                self.last["ath"] = self.ath_highs[0][1]
+                self.last["ath_lower"] = self.ath_highs[0][1] * ALL_TIME_HIGH_RANGE
+        while self.ath_highs and self.ath_highs[-1][1] <= high:
+            self.ath_highs.pop()
+        self.ath_highs.append([index, high])
+
+        self.prev = self.last
+        self.last = {
+            "open": opn,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume,
+            "hl2": hl2,
+            "sma_short": sma_short,
+            "sma_long": sma_long,
+            "ema_short": self.ema_short,
+            "ema_long": self.ema_long,
+            "ema_long_delta": self.ema_long - ema_long_prev,
+            "stdev_short": stdev_short,
+            "bb_upper": sma_short + 2 * stdev_short,
+            "bb_lower": sma_short - 2 * stdev_short,
+            "stoch_k_highest": stoch_k_highest,
+            "stoch_k_lowest": stoch_k_lowest,
+            "stoch_k_raw": stoch_k_raw,
+            "stoch_k": stoch_k,
+            "stoch_d": stoch_d,
+            "ath": ath,
+            "ath_lower": ath * ALL_TIME_HIGH_RANGE,
+        }
+        return self.last
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            name: list(value) if isinstance(value, deque) else value
+            for (name, value) in vars(self).items()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "State":
+        state = cls()
+        for (name, value) in data.items():
+            if isinstance(getattr(state, name), deque):
+                value = deque(value)
+            setattr(state, name, value)
+        return state
+
+
+def _ewm_step(ema: float, value: float, span: int) -> float:
+    """
+    One step of pandas `ewm(span=span, adjust=False).mean()`
+    """
+    if isnan(ema):
+        return value
+    alpha = 2 / (span + 1)
+    return (1 - alpha) * ema + alpha * value
+
+
+def _window_mean(window: deque, value: float, size: int) -> float:
+    """
+    Push value to a window of given size and return the window mean
+
+    NaN until the window is full or while it contains NaN, like with pandas
+    rolling mean. The windows are only a few values long.
+    """
+    window.append(value)
+    if len(window) > size:
+        window.popleft()
+    if len(window) < size:
+        return nan
+    return sum(window) / size
+
+
+def state_filename(symbol: Symbol) -> str:
+    return "{0}/{1}.state.json".format(STORE_DIR, symbol.symbol_marketstack)
+
+
+def load_state(symbol: Symbol) -> Optional[State]:
+    """
+    Read saved indicator state of a symbol
+
+    :param symbol: market symbol
+    :returns: state or None if nothing has been saved, or if it was saved
+     with different fields by an earlier version
+    """
+    filename = state_filename(symbol)
+    if not path.isfile(filename):
+        return None
+    with open(filename, mode="r") as file:
+        data = json_loads(file.read())
+    if set(data) != set(vars(State())):
+        return None
+    return State.from_dict(data)
+
+
+def save_state(symbol: Symbol, state: State):
+    """
+    Save indicator state of a symbol
+
+    :param symbol: market symbol
+    :param state: indicator state
+    """
+    filename = state_filename(symbol)
+    with open(filename + ".tmp", mode="w") as file:
+        file.write(json_dumps(state.to_dict()))
+    replace(filename + ".tmp", filename)
+
+
+def sync(symbol: Symbol, state: Optional[State] = None) -> State:
+    """
+    Bring indicator state of a symbol up to date with the store
+
+    Only bars after the state's last bar are added. The state is rebuilt
+    from the whole history only if the state's last bar is not in the
+    stored history with the same close (corrected or dropped), or if
+    there is no state yet. The oldest stored bars drop off as new ones
+    are added, see get_data.merge_bars, so the number of bars does not
+    tell whether the history has changed. The state's last bar is found
+    with a binary search, so an update converts only the new bars.
+
+    :param symbol: market symbol
+    :param state: state to update, default is the saved one
+    :returns: updated state
+    """
+    bars = read(symbol)
+
+    start = 0
+    if state is not None and state.date is not None:
+        date = datetime64(state.date)
+        start = int(bars["date"].searchsorted(date)) + 1
+        if (
+            start > len(bars)
+            or bars["date"][start - 1] != date
+            or bars["close"][start - 1] != state.last["close"]
+        ):
+            state = None
+            start = 0
+
+    if state is None:
+        state = State()
+
+    for row in range(start, len(bars)):
+        bar = bars[row]
+        state.update(
+            str(bar["date"]),
+            float(bar["open"]),
+            float(bar["high"]),
+            float(bar["low"]),
+            float(bar["close"]),
+            float(bar["volume"]),
+        )
+    return state
+
+
+def evaluate(
+    symbols: Optional[List[Symbol]] = None,
+) -> List[Tuple[Symbol, bool, str]]:
+    """
+    Update saved indicator states from the store and evaluate highlighting
+
+    Symbols without stored bars are skipped.
+
+    :param symbols: market symbols, default is all symbols
+    :returns: list of (symbol, highlight, summary) tuples
+    """
+    if symbols is None:
+        symbols = catalog().symbols
+    results = []
+    for symbol in symbols:
+        if not path.isfile(store_filename(symbol)):
+            print("{0} => no stored data, skipped".format(symbol.name))
+            continue
+        state = sync(symbol, load_state(symbol))
+        save_state(symbol, state)
+        (highlight, summary) = summarize(symbol, state.last, state.prev)
+        results.append((symbol, highlight, summary))
+    return results
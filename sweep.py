@@ -0,0 +1,225 @@
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing.shared_memory import SharedMemory
+from numpy import concatenate, isnan, ndarray  # type: ignore
+from os import cpu_count
+from pandas import DataFrame  # type: ignore
+from typing import Any, Dict, List, Optional, Tuple
+
+from analyze import RULES, Parameters
+from backtest import forward_returns, parse_horizon, signals
+from batch import PRICE_DTYPE, Universe, compute, load, rule_fields, rule_parameters
+from symbols import catalog
+
+# Forward return horizon in bars used for ranking
+HORIZON = 5
+
+# Number of parameter combinations sent to a worker at a time
+CHUNK_SIZE = 16
+
+# Universe in a worker process, attached to shared memory in _init_worker
+_universe = Universe([], None, {})
+_returns: Any = None
+_shared: List[SharedMemory] = []
+
+# Indicator arrays of a worker process, reused for every combination
+_indicators: Dict[str, Any] = {}
+
+
+def share(universe: Universe) -> Tuple[List[SharedMemory], Dict[str, Tuple]]:
+    """
+    Copy prices of a universe to shared memory
+
+    :param universe: universe with prices
+    :returns (blocks, layout): a tuple with
+     - blocks: shared memory blocks, to be closed and unlinked when done
+     - layout: dictionary from field to (block name, shape, dtype) for
+       attaching to the blocks in other processes
+    """
+    blocks = []
+    layout = {}
+    for (field, values) in universe.prices.items():
+        block = SharedMemory(create=True, size=max(values.nbytes, 1))
+        ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        blocks.append(block)
+        layout[field] = (block.name, values.shape, values.dtype.str)
+    return (blocks, layout)
+
+
+def _init_worker(layout: Dict[str, Tuple], horizon: int):
+    """
+    Attach worker process to prices in shared memory
+    """
+    global _universe, _returns
+
+    prices: Dict[str, Any] = {}
+    for (field, (name, shape, dtype)) in layout.items():
+        block = SharedMemory(name=name)
+        # keep a reference, the arrays are valid only while the block is open
+        _shared.append(block)
+        prices[field] = ndarray(shape, dtype=dtype, buffer=block.buf)
+    _universe = Universe([], None, prices)
+    _returns = forward_returns(prices["close"], horizon)
+
+
+def score(
+    universe: Universe,
+    parameters: Parameters,
+    returns,
+    indicators: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Backtest highlighting rules with given parameters
+
+    :param universe: universe with prices
+    :param parameters: analyze parameters
+    :param returns: bars × symbols forward returns
+    :param indicators: indicator arrays to reuse, see batch.compute
+    :returns: parameters with signal count, hit rate and mean signed
+     forward return of all rules together and of each rule
+    """
+    indicators = compute(universe, parameters, indicators, rule_fields())
+    fired = signals(universe, indicators)
+
+    result: Dict[str, Any] = dict(parameters._asdict())
+    total = []
+    for (name, direction, _, _, _) in RULES:
+        signed = (-1 if direction == "D" else 1) * returns[fired[name]]
+        signed = signed[~isnan(signed)]
+        result["{0}_signals".format(name)] = len(signed)
+        result["{0}_mean_return".format(name)] = signed.mean() if len(signed) else None
+        total.append(signed)
+
+    signed = concatenate(total)
+    result["signals"] = len(signed)
+    result["hit_rate"] = (signed > 0).mean() if len(signed) else None
+    result["mean_return"] = signed.mean() if len(signed) else None
+    return result
+
+
+def _score_chunk(combinations: List[Parameters]) -> List[Dict[str, Any]]:
+    return [
+        score(_universe, parameters, _returns, _indicators)
+        for parameters in combinations
+    ]
+
+
+def grid(values: Dict[str, List]) -> List[Parameters]:
+    """
+    All combinations of parameter values
+
+    :param values: dictionary from Parameters field to list of values,
+     fields not given use their defaults
+    :returns: list of parameters
+    """
+    names = list(values)
+    return [
+        Parameters(**dict(zip(names, combination)))
+        for combination in product(*[values[name] for name in names])
+    ]
+
+
+def sweep(
+    universe: Universe,
+    combinations: List[Parameters],
+    horizon: int = HORIZON,
+    workers: Optional[int] = None,
+):
+    """
+    Backtest highlighting rules for every parameter combination
+
+    Prices are shared with worker processes through shared memory, only
+    parameters and scores are sent between processes.
+
+    :param universe: universe with prices
+    :param combinations: parameters to evaluate
+    :param horizon: forward return horizon in bars
+    :param workers: number of worker processes, default is CPU count
+    :returns: pandas dataframe with a row for each combination, sorted by
+     mean signed forward return
+    """
+    (blocks, layout) = share(universe)
+    try:
+        chunks = [
+            combinations[start : start + CHUNK_SIZE]
+            for start in range(0, len(combinations), CHUNK_SIZE)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=workers or cpu_count(),
+            initializer=_init_worker,
+            initargs=(layout, horizon),
+        ) as pool:
+            rows = [row for chunk in pool.map(_score_chunk, chunks) for row in chunk]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return DataFrame(rows).sort_values("mean_return", ascending=False)
+
+
+def main():
+    parser = ArgumentParser(
+        description="Backtest highlighting rules over a grid of analyze parameters"
+    )
+    parser.add_argument(
+        "grid",
+        nargs="+",
+        metavar="NAME=VALUES",
+        help="comma-separated values for a parameter, for example "
+        "window_size_short=5,10,20 (parameters: {0})".format(
+            ", ".join(rule_parameters())
+        ),
+    )
+    parser.add_argument(
+        "--horizon",
+        type=parse_horizon,
+        default=HORIZON,
+        help="forward return horizon in bars",
+    )
+    parser.add_argument("--workers", type=int, help="number of worker processes")
+    parser.add_argument(
+        "--dtype",
+        choices=["f8", "f4"],
+        default=PRICE_DTYPE,
+        help="type of prices and indicators, f4 takes half the memory",
+    )
+    parser.add_argument(
+        "--min-signals", type=int, default=0, help="minimum number of signals"
+    )
+    parser.add_argument("--top", type=int, default=20, help="number of rows printed")
+    parser.add_argument("--output", help="CSV file for all results")
+    args = parser.parse_args()
+
+    types = Parameters.__annotations__
+    # other parameters would give the same signals for every value
+    used = rule_parameters()
+    values = {}
+    for argument in args.grid:
+        (name, _, text) = argument.partition("=")
+        if name not in types:
+            parser.error("unknown parameter {0}".format(name))
+        if name not in used:
+            parser.error(
+                "parameter {0} does not change the rules, they depend on {1}".format(
+                    name, ", ".join(used)
+                )
+            )
+        values[name] = [types[name](value) for value in text.split(",")]
+
+    combinations = grid(values)
+    print("Sweeping {0} parameter combinations".format(len(combinations)))
+
+    universe = load(catalog().symbols, args.dtype)
+    results = sweep(universe, combinations, args.horizon, args.workers)
+    results = results[results["signals"] >= args.min_signals]
+
+    print(results.head(args.top).to_string(index=False))
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print("Results saved to {0}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
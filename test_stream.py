@@ -0,0 +1,85 @@
+from numpy import arange, array, busday_offset, datetime64, isnan  # type: ignore
+from numpy import save as np_save  # type: ignore
+from numpy.random import default_rng  # type: ignore
+
+import batch
+import store
+import stream
+from config import HISTORY_LIMIT
+from store import DTYPE, store_filename
+from symbols import Symbol
+
+SYMBOL = Symbol("Synthetic", "SYN.XSYN", "SYN:SYN")
+
+
+def bars(count: int, seed: int = 0):
+    """
+    Synthetic daily bars, highest high on the first bar
+    """
+    rng = default_rng(seed)
+    close = 100 * (1 + rng.normal(0, 0.02, count)).cumprod()
+    high = close * (1 + abs(rng.normal(0, 0.01, count)))
+    low = close * (1 - abs(rng.normal(0, 0.01, count)))
+    high[0] = close.max() * 2
+    days = busday_offset(datetime64("2020-01-01"), arange(count), roll="forward")
+    return array(
+        list(zip(days, close, high, low, close, rng.uniform(1, 100, count))),
+        dtype=DTYPE,
+    )
+
+
+def write(tmp_path, monkeypatch, stored):
+    monkeypatch.setattr(store, "STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(stream, "STORE_DIR", str(tmp_path))
+    np_save(store_filename(SYMBOL), stored)
+
+
+def assert_same_as_compute(state):
+    universe = batch.load([SYMBOL])
+    indicators = batch.compute(universe)
+    columns = dict(universe.prices, **indicators)
+    for (name, bar) in [("last", state.last), ("prev", state.prev)]:
+        row = -1 if name == "last" else -2
+        for (field, values) in columns.items():
+            expected = values[row, 0]
+            if isnan(expected):
+                assert isnan(bar[field]), (name, field)
+            else:
+                assert abs(bar[field] - expected) <= 1e-6 * abs(expected), (
+                    name,
+                    field,
+                    bar[field],
+                    expected,
+                )
+
+
+def test_sync_rolling_history(tmp_path, monkeypatch):
+    history = bars(HISTORY_LIMIT + 1)
+    write(tmp_path, monkeypatch, history[:HISTORY_LIMIT])
+    state = stream.sync(SYMBOL)
+    assert_same_as_compute(state)
+
+    # a new bar is stored and the oldest one, the all-time high, drops off
+    write(tmp_path, monkeypatch, history[1:])
+    updates = []
+    update = stream.State.update
+    monkeypatch.setattr(
+        stream.State,
+        "update",
+        lambda self, *bar: updates.append(bar) or update(self, *bar),
+    )
+    state = stream.sync(SYMBOL, state)
+    assert len(updates) == 1
+    assert_same_as_compute(state)
+
+
+def test_sync_corrected_bar(tmp_path, monkeypatch):
+    history = bars(300)
+    write(tmp_path, monkeypatch, history[:-1])
+    state = stream.sync(SYMBOL)
+
+    history["close"][-2] *= 1.01
+    write(tmp_path, monkeypatch, history)
+    state = stream.sync(SYMBOL, state)
+    assert state.count == len(history)
+    assert_same_as_compute(state)
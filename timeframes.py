@@ -0,0 +1,174 @@
+from numpy import (  # type: ignore
+    add,
+    arange,
+    bincount,
+    concatenate,
+    cumsum,
+    flatnonzero,
+    fmax,
+    fmin,
+    full,
+    int64,
+    isnat,
+    nan,
+    repeat,
+    zeros,
+)
+from typing import Any, Dict, List
+
+from analyze import RULES, Parameters
+from batch import Universe, compute, rule_fields
+from store import FIELDS
+
+# Timeframes as name: numpy date unit of a period, None for daily bars
+TIMEFRAMES = {"daily": None, "weekly": "W", "monthly": "M"}
+
+# Timeframe names in summaries
+TIMEFRAME_NAMES = {"daily": "päivä", "weekly": "viikko", "monthly": "kuukausi"}
+
+
+def _periods(dates, unit: str):
+    """
+    Period number of each date, weeks starting on Monday
+    """
+    days = dates.astype("datetime64[D]").astype(int64)
+    if unit == "W":
+        # 1970-01-05, day 4 of the epoch, is a Monday
+        return (days - 4) // 7
+    return dates.astype("datetime64[M]").astype(int64)
+
+
+def resample(universe: Universe, unit: str) -> Universe:
+    """
+    Build bars of a longer timeframe from daily bars of a universe
+
+    All symbols are resampled at once. Cells of the bars × symbols arrays
+    are taken column by column, and each run of days in the same period
+    is reduced to one bar with first open, highest high, lowest low, last
+    close, total volume and date of the last day. The latest period can
+    be incomplete, like the current week.
+
+    :param universe: universe with daily prices
+    :param unit: "W" for weekly or "M" for monthly bars
+    :returns: universe with a bar per period, aligned like daily bars,
+     without rows if there are no bars
+    """
+    symbols = len(universe.symbols)
+    # cells in column order, so that each symbol's bars are consecutive
+    dates = universe.dates.T.ravel()
+    valid = ~isnat(dates)
+    dates = dates[valid]
+    if len(dates) == 0:
+        return Universe(
+            universe.symbols,
+            full((0, symbols), "NaT", dtype="datetime64[D]"),
+            {field: full((0, symbols), nan) for field in FIELDS},
+        )
+    columns = repeat(arange(symbols), len(universe.dates))[valid]
+    prices = {
+        field: values.T.ravel()[valid] for (field, values) in universe.prices.items()
+    }
+
+    periods = _periods(dates, unit)
+    starts = flatnonzero(
+        concatenate(
+            [[True], (periods[1:] != periods[:-1]) | (columns[1:] != columns[:-1])]
+        )
+    )
+    ends = concatenate([starts[1:], [len(dates)]]) - 1
+
+    resampled = {
+        "open": prices["open"][starts],
+        "high": fmax.reduceat(prices["high"], starts),
+        "low": fmin.reduceat(prices["low"], starts),
+        "close": prices["close"][ends],
+        "volume": add.reduceat(prices["volume"], starts),
+    }
+
+    # align the periods of each symbol to the bottom rows again
+    period_columns = columns[starts]
+    counts = bincount(period_columns, minlength=symbols)
+    length = counts.max(initial=0)
+    # index of each period within its symbol, counted from the first one
+    index = arange(len(starts)) - (cumsum(counts) - counts)[period_columns]
+    rows = length - counts[period_columns] + index
+
+    aligned_dates = full((length, symbols), "NaT", dtype="datetime64[D]")
+    aligned_dates[rows, period_columns] = dates[ends]
+    aligned = {}
+    for field in FIELDS:
+        aligned[field] = full((length, symbols), nan, dtype=resampled[field].dtype)
+        aligned[field][rows, period_columns] = resampled[field]
+
+    return Universe(universe.symbols, aligned_dates, aligned)
+
+
+def timeframes(universe: Universe) -> Dict[str, Universe]:
+    """
+    Universe in each timeframe of TIMEFRAMES
+
+    :param universe: universe with daily prices
+    :returns: dictionary from timeframe name to universe
+    """
+    return {
+        name: universe if unit is None else resample(universe, unit)
+        for (name, unit) in TIMEFRAMES.items()
+    }
+
+
+def fired(
+    universe: Universe, parameters: Parameters = Parameters()
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Evaluate highlighting rules on the last bar of each timeframe
+
+    :param universe: universe with daily prices
+    :param parameters: analyze parameters, window sizes are in bars of
+     each timeframe
+    :returns: dictionary from timeframe name to a dictionary from rule
+     name to boolean array over symbols
+    """
+    results = {}
+    for (name, resampled) in timeframes(universe).items():
+        if len(resampled.dates) == 0:
+            # no bars, like when all downloads of a run have failed
+            results[name] = {
+                rule_name: zeros(len(resampled.symbols), dtype=bool)
+                for (rule_name, _, _, _, _) in RULES
+            }
+            continue
+        columns = dict(resampled.prices)
+        columns.update(compute(resampled, parameters, fields=rule_fields()))
+        last = {field: values[-1] for (field, values) in columns.items()}
+        # rules need two bars, a single bar compares with itself
+        prev = {
+            field: values[-2 if len(values) > 1 else -1]
+            for (field, values) in columns.items()
+        }
+        results[name] = {
+            rule_name: rule(last, prev) for (rule_name, _, rule, _, _) in RULES
+        }
+    return results
+
+
+def describe(rules: Dict[str, Dict[str, Any]], column: int) -> str:
+    """
+    Describe in which timeframes rules fire for a symbol, for adding to a
+    summary
+
+    :param rules: rules fired in each timeframe, see fired
+    :param column: index of the symbol
+    :returns: lines of text, empty if no rule fires in any timeframe
+    """
+    text = ""
+    for (rule_name, _, _, _, _) in RULES:
+        agreeing: List[str] = [
+            TIMEFRAME_NAMES[timeframe]
+            for timeframe in TIMEFRAMES
+            if rules[timeframe][rule_name][column]
+        ]
+        if agreeing:
+            text += "- {0} aikatasoilla {1} ({2}/{3})\n".format(
+                rule_name, ", ".join(agreeing), len(agreeing), len(TIMEFRAMES)
+            )
+    return text